@@ -4,9 +4,15 @@ import logging
 from datetime import datetime
 import uuid
 
-from app.models.schemas import LenderCreate, Lender, LenderMatchRequest, APIResponse
-from app.database.connection import get_supabase_client
+from app.models.schemas import (
+    LenderCreate, Lender, LenderMatchRequest, LoanApplication, RateQuoteRequest, APIResponse
+)
+from app.database.connection import get_supabase_client, execute_query
 from app.services.lender_matching_service import LenderMatchingService
+from app.services.lender_index import get_lender_index
+from app.services.application_index import get_application_index
+from app.services.application_rematch import get_application_rematcher
+from app.utils.pagination import paginate, page_of, InvalidCursorError
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -24,9 +30,10 @@ async def create_lender(lender_data: LenderCreate):
         lender_dict["updated_at"] = datetime.now().isoformat()
         
         # Insert lender
-        response = supabase.table("lenders") \
-            .insert(lender_dict) \
-            .execute()
+        response = await execute_query(
+            supabase.table("lenders")
+                .insert(lender_dict)
+        )
         
         if not response.data:
             raise HTTPException(
@@ -35,6 +42,8 @@ async def create_lender(lender_data: LenderCreate):
             )
         
         created_lender = Lender(**response.data[0])
+        get_lender_index().upsert(response.data[0])
+        get_application_rematcher().lender_changed(None, response.data[0])
         
         return APIResponse(
             success=True,
@@ -81,18 +90,19 @@ async def get_lender(lender_id: str):
         )
 
 @router.get("/lenders/", response_model=APIResponse)
-async def list_lenders(limit: int = 10, offset: int = 0):
-    """List all lenders with pagination"""
+async def list_lenders(limit: int = 10, offset: int = 0, cursor: Optional[str] = None):
+    """List all lenders with pagination, by offset or by the previous page's next_cursor"""
     try:
         supabase = get_supabase_client()
         
-        response = supabase.table("lenders") \
-            .select("*") \
-            .range(offset, offset + limit - 1) \
-            .order("created_at", desc=True) \
-            .execute()
+        query = (
+            supabase.table("lenders")
+                .select("*")
+        )
+        response = await execute_query(paginate(query, limit, offset=offset, cursor=cursor))
         
-        lenders = [Lender(**lender_data) for lender_data in response.data]
+        rows, next_cursor = page_of(response.data, limit)
+        lenders = [Lender(**lender_data) for lender_data in rows]
         
         return APIResponse(
             success=True,
@@ -101,10 +111,16 @@ async def list_lenders(limit: int = 10, offset: int = 0):
                 "lenders": lenders,
                 "total": len(lenders),
                 "limit": limit,
-                "offset": offset
+                "offset": offset,
+                "next_cursor": next_cursor
             }
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error listing lenders: {e}")
         raise HTTPException(
@@ -133,25 +149,141 @@ async def get_lender_performance(lender_id: str):
             detail="Internal server error"
         )
 
+@router.get("/lenders/{lender_id}/eligible-applications", response_model=APIResponse)
+async def get_eligible_applications(lender_id: str, limit: int = 50, offset: int = 0):
+    """Get pending loan applications a lender qualifies for, newest first"""
+    try:
+        lender_index = get_lender_index()
+        await lender_index.ensure_fresh()
+        
+        lender = lender_index.get(lender_id)
+        if not lender:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Lender not found"
+            )
+        
+        applications, total = await get_application_index().eligible_applications(
+            lender, limit=limit, offset=offset
+        )
+        
+        return APIResponse(
+            success=True,
+            message=f"Found {total} eligible loan applications",
+            data={
+                "lender_id": lender_id,
+                "applications": [LoanApplication(**app_data) for app_data in applications],
+                "total": total,
+                "limit": limit,
+                "offset": offset
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting eligible applications for lender {lender_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.get("/lenders/{lender_id}/quote", response_model=APIResponse)
+async def get_lender_quote(lender_id: str, loan_amount: float, term_months: int,
+                           trust_score: Optional[float] = None, user_id: Optional[str] = None):
+    """Get a lender's interest rate for a trust score, or a user's current one"""
+    try:
+        lender_service = LenderMatchingService()
+        
+        quotes = await lender_service.get_rate_quotes(
+            loan_amount, term_months, trust_score=trust_score, user_id=user_id, lender_ids=[lender_id]
+        )
+        
+        if not quotes:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Lender not found"
+            )
+        
+        return APIResponse(
+            success=True,
+            message="Rate quote retrieved successfully",
+            data=quotes[0]
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error getting rate quote for lender {lender_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.post("/lenders/quotes", response_model=APIResponse)
+async def get_lender_quotes(request: RateQuoteRequest):
+    """Get interest rates across many lenders, or all of them, for one borrower"""
+    try:
+        lender_service = LenderMatchingService()
+        
+        quotes = await lender_service.get_rate_quotes(
+            request.loan_amount,
+            request.term_months,
+            trust_score=request.trust_score,
+            user_id=request.user_id,
+            lender_ids=request.lender_ids
+        )
+        
+        return APIResponse(
+            success=True,
+            message=f"Retrieved {len(quotes)} rate quotes",
+            data={
+                "quotes": quotes,
+                "total": len(quotes),
+                "loan_amount": request.loan_amount,
+                "term_months": request.term_months
+            }
+        )
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error getting rate quotes: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
 @router.post("/lenders/match", response_model=APIResponse)
 async def find_matching_lenders(request: LenderMatchRequest):
     """Find matching lenders for a user's loan request"""
     try:
         lender_service = LenderMatchingService()
         
-        matches = await lender_service.find_matching_lenders(
+        page = await lender_service.find_matching_lenders_page(
             request.user_id,
             request.loan_amount,
             request.loan_type,
-            request.term_months
+            request.term_months,
+            limit=request.limit,
+            cursor=request.cursor
         )
         
         return APIResponse(
             success=True,
-            message=f"Found {len(matches)} matching lenders",
+            message=f"Found {page['total_matches']} matching lenders",
             data={
-                "matches": [match.dict() for match in matches],
-                "total_matches": len(matches),
+                "matches": [match.dict() for match in page['matches']],
+                "total_matches": page['total_matches'],
+                "next_cursor": page['next_cursor'],
                 "user_id": request.user_id,
                 "loan_amount": request.loan_amount,
                 "loan_type": request.loan_type,
@@ -171,6 +303,29 @@ async def find_matching_lenders(request: LenderMatchRequest):
             detail="Internal server error"
         )
 
+@router.get("/lenders/match/metrics", response_model=APIResponse)
+async def get_match_metrics():
+    """Get lender match cache, index and re-matching metrics"""
+    try:
+        lender_service = LenderMatchingService()
+        
+        return APIResponse(
+            success=True,
+            message="Lender match metrics retrieved successfully",
+            data={
+                **lender_service.get_metrics(),
+                "applications": get_application_index().stats(),
+                "rematch": get_application_rematcher().stats()
+            }
+        )
+        
+    except Exception as e:
+        logger.error(f"Error getting lender match metrics: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
 @router.post("/lenders/sample", response_model=APIResponse)
 async def create_sample_lenders():
     """Create sample lenders for testing"""
@@ -197,11 +352,12 @@ async def update_lender(lender_id: str, lender_data: dict):
     try:
         supabase = get_supabase_client()
         
-        # Check if lender exists
-        existing_lender = supabase.table("lenders") \
-            .select("id") \
-            .eq("id", lender_id) \
-            .execute()
+        # Check if lender exists, keeping its current bounds for re-matching
+        existing_lender = await execute_query(
+            supabase.table("lenders")
+                .select("*")
+                .eq("id", lender_id)
+        )
         
         if not existing_lender.data:
             raise HTTPException(
@@ -214,10 +370,11 @@ async def update_lender(lender_id: str, lender_data: dict):
         update_data["updated_at"] = datetime.now().isoformat()
         
         # Update lender
-        response = supabase.table("lenders") \
-            .update(update_data) \
-            .eq("id", lender_id) \
-            .execute()
+        response = await execute_query(
+            supabase.table("lenders")
+                .update(update_data)
+                .eq("id", lender_id)
+        )
         
         if not response.data:
             raise HTTPException(
@@ -226,6 +383,8 @@ async def update_lender(lender_id: str, lender_data: dict):
             )
         
         updated_lender = Lender(**response.data[0])
+        get_lender_index().upsert(response.data[0])
+        get_application_rematcher().lender_changed(existing_lender.data[0], response.data[0])
         
         return APIResponse(
             success=True,
@@ -248,11 +407,12 @@ async def delete_lender(lender_id: str):
     try:
         supabase = get_supabase_client()
         
-        # Check if lender exists
-        existing_lender = supabase.table("lenders") \
-            .select("id") \
-            .eq("id", lender_id) \
-            .execute()
+        # Check if lender exists, keeping its current bounds for re-matching
+        existing_lender = await execute_query(
+            supabase.table("lenders")
+                .select("*")
+                .eq("id", lender_id)
+        )
         
         if not existing_lender.data:
             raise HTTPException(
@@ -261,10 +421,13 @@ async def delete_lender(lender_id: str):
             )
         
         # Delete lender
-        response = supabase.table("lenders") \
-            .delete() \
-            .eq("id", lender_id) \
-            .execute()
+        response = await execute_query(
+            supabase.table("lenders")
+                .delete()
+                .eq("id", lender_id)
+        )
+        get_lender_index().remove(lender_id)
+        get_application_rematcher().lender_changed(existing_lender.data[0], None)
         
         return APIResponse(
             success=True,
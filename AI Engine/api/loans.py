@@ -1,13 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
 from typing import List, Optional
 import logging
 from datetime import datetime
 import uuid
 
 from app.models.schemas import LoanApplicationCreate, LoanApplication, APIResponse
-from app.database.connection import get_supabase_client
+from app.database.connection import get_supabase_client, execute_query
 from app.services.lender_matching_service import LenderMatchingService
+from app.services.application_index import get_application_index
+from app.services.lender_performance import (
+    get_lender_performance_tracker, is_same_decision, APPROVED_STATUSES, REJECTED_STATUSES
+)
 from app.services.trust_score_service import TrustScoreService
+from app.services.model_registry import ModelNotReadyError
+from app.utils.concurrency import gather_all
+from app.utils.pagination import paginate, page_of, InvalidCursorError
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -18,11 +25,16 @@ async def apply_for_loan(application_data: LoanApplicationCreate):
     try:
         supabase = get_supabase_client()
         
-        # Verify user exists
-        user_response = supabase.table("users") \
-            .select("id") \
-            .eq("id", application_data.user_id) \
-            .execute()
+        # Verify user exists while fetching their trust score
+        trust_service = TrustScoreService()
+        user_response, trust_score_data = await gather_all(
+            execute_query(
+                supabase.table("users")
+                    .select("id")
+                    .eq("id", application_data.user_id)
+            ),
+            trust_service.get_trust_score(application_data.user_id)
+        )
         
         if not user_response.data:
             raise HTTPException(
@@ -30,10 +42,6 @@ async def apply_for_loan(application_data: LoanApplicationCreate):
                 detail="User not found"
             )
         
-        # Get user's trust score
-        trust_service = TrustScoreService()
-        trust_score_data = await trust_service.get_trust_score(application_data.user_id)
-        
         if not trust_score_data:
             # Calculate trust score if not available
             trust_score_data = await trust_service.calculate_trust_score(application_data.user_id)
@@ -42,12 +50,14 @@ async def apply_for_loan(application_data: LoanApplicationCreate):
         
         # Find matching lenders
         lender_service = LenderMatchingService()
-        matches = await lender_service.find_matching_lenders(
+        page = await lender_service.find_matching_lenders_page(
             application_data.user_id,
             application_data.amount,
             application_data.loan_type,
-            application_data.term_months
+            application_data.term_months,
+            limit=5
         )
+        matches = page['matches']
         
         # Create loan application
         application_dict = application_data.dict()
@@ -59,9 +69,10 @@ async def apply_for_loan(application_data: LoanApplicationCreate):
         application_dict["updated_at"] = datetime.now().isoformat()
         
         # Insert application
-        response = supabase.table("loan_applications") \
-            .insert(application_dict) \
-            .execute()
+        response = await execute_query(
+            supabase.table("loan_applications")
+                .insert(application_dict)
+        )
         
         if not response.data:
             raise HTTPException(
@@ -70,6 +81,7 @@ async def apply_for_loan(application_data: LoanApplicationCreate):
             )
         
         created_application = LoanApplication(**response.data[0])
+        get_application_index().upsert(response.data[0])
         
         return APIResponse(
             success=True,
@@ -77,13 +89,18 @@ async def apply_for_loan(application_data: LoanApplicationCreate):
             data={
                 "application": created_application,
                 "trust_score": trust_score,
-                "matching_lenders": len(matches),
+                "matching_lenders": page['total_matches'],
                 "top_matches": [match.dict() for match in matches[:3]]
             }
         )
         
     except HTTPException:
         raise
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error applying for loan: {e}")
         raise HTTPException(
@@ -97,11 +114,12 @@ async def get_loan_application(application_id: str):
     try:
         supabase = get_supabase_client()
         
-        response = supabase.table("loan_applications") \
-            .select("*") \
-            .eq("id", application_id) \
-            .single() \
-            .execute()
+        response = await execute_query(
+            supabase.table("loan_applications")
+                .select("*")
+                .eq("id", application_id)
+                .single()
+        )
         
         if not response.data:
             raise HTTPException(
@@ -127,16 +145,18 @@ async def get_loan_application(application_id: str):
         )
 
 @router.get("/loans/user/{user_id}", response_model=APIResponse)
-async def get_user_loan_applications(user_id: str, limit: int = 10, offset: int = 0):
-    """Get all loan applications for a user"""
+async def get_user_loan_applications(user_id: str, limit: int = 10, offset: int = 0,
+                                     cursor: Optional[str] = None):
+    """Get all loan applications for a user, paged by offset or by the previous page's next_cursor"""
     try:
         supabase = get_supabase_client()
         
         # Verify user exists
-        user_response = supabase.table("users") \
-            .select("id") \
-            .eq("id", user_id) \
-            .execute()
+        user_response = await execute_query(
+            supabase.table("users")
+                .select("id")
+                .eq("id", user_id)
+        )
         
         if not user_response.data:
             raise HTTPException(
@@ -144,14 +164,15 @@ async def get_user_loan_applications(user_id: str, limit: int = 10, offset: int
                 detail="User not found"
             )
         
-        response = supabase.table("loan_applications") \
-            .select("*") \
-            .eq("user_id", user_id) \
-            .order("created_at", desc=True) \
-            .range(offset, offset + limit - 1) \
-            .execute()
+        query = (
+            supabase.table("loan_applications")
+                .select("*")
+                .eq("user_id", user_id)
+        )
+        response = await execute_query(paginate(query, limit, offset=offset, cursor=cursor))
         
-        applications = [LoanApplication(**app_data) for app_data in response.data]
+        rows, next_cursor = page_of(response.data, limit)
+        applications = [LoanApplication(**app_data) for app_data in rows]
         
         return APIResponse(
             success=True,
@@ -160,12 +181,18 @@ async def get_user_loan_applications(user_id: str, limit: int = 10, offset: int
                 "applications": applications,
                 "total": len(applications),
                 "limit": limit,
-                "offset": offset
+                "offset": offset,
+                "next_cursor": next_cursor
             }
         )
         
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error getting loan applications for user {user_id}: {e}")
         raise HTTPException(
@@ -174,16 +201,29 @@ async def get_user_loan_applications(user_id: str, limit: int = 10, offset: int
         )
 
 @router.put("/loans/{application_id}/status", response_model=APIResponse)
-async def update_loan_status(application_id: str, status: str):
-    """Update loan application status"""
+async def update_loan_status(application_id: str, new_status: str = Query(..., alias="status"),
+                             lender_id: Optional[str] = None):
+    """
+    Update loan application status
+    
+    Approving or rejecting requires the lender that decided, which is moved
+    first in matched_lenders so lender performance credits the decision to it.
+    """
     try:
+        if new_status in APPROVED_STATUSES + REJECTED_STATUSES and not lender_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"lender_id is required to set status {new_status}"
+            )
+        
         supabase = get_supabase_client()
         
-        # Check if application exists
-        existing_app = supabase.table("loan_applications") \
-            .select("id") \
-            .eq("id", application_id) \
-            .execute()
+        # Check if application exists, keeping its current state for lender performance
+        existing_app = await execute_query(
+            supabase.table("loan_applications")
+                .select("id, status, matched_lenders, created_at, updated_at")
+                .eq("id", application_id)
+        )
         
         if not existing_app.data:
             raise HTTPException(
@@ -192,13 +232,23 @@ async def update_loan_status(application_id: str, status: str):
             )
         
         # Update status
-        response = supabase.table("loan_applications") \
-            .update({
-                "status": status,
-                "updated_at": datetime.now().isoformat()
-            }) \
-            .eq("id", application_id) \
-            .execute()
+        existing = existing_app.data[0]
+        update_data = {"status": new_status}
+        if lender_id:
+            # The deciding lender is kept first in matched_lenders
+            matched_lenders = existing.get("matched_lenders") or []
+            update_data["matched_lenders"] = [lender_id] + [
+                matched_id for matched_id in matched_lenders if matched_id != lender_id
+            ]
+        # A re-sent decision keeps the time of the original one, its processing time
+        if not is_same_decision(existing, {**existing, **update_data}):
+            update_data["updated_at"] = datetime.now().isoformat()
+        
+        response = await execute_query(
+            supabase.table("loan_applications")
+                .update(update_data)
+                .eq("id", application_id)
+        )
         
         if not response.data:
             raise HTTPException(
@@ -207,10 +257,12 @@ async def update_loan_status(application_id: str, status: str):
             )
         
         updated_application = LoanApplication(**response.data[0])
+        get_application_index().upsert(response.data[0])
+        get_lender_performance_tracker().record_transition(existing_app.data[0], response.data[0])
         
         return APIResponse(
             success=True,
-            message=f"Loan application status updated to {status}",
+            message=f"Loan application status updated to {new_status}",
             data=updated_application
         )
         
@@ -224,22 +276,25 @@ async def update_loan_status(application_id: str, status: str):
         )
 
 @router.get("/loans/", response_model=APIResponse)
-async def list_loan_applications(limit: int = 10, offset: int = 0, status: Optional[str] = None):
-    """List all loan applications with optional filtering"""
+async def list_loan_applications(limit: int = 10, offset: int = 0,
+                                 status_filter: Optional[str] = Query(None, alias="status"),
+                                 cursor: Optional[str] = None):
+    """List all loan applications with optional filtering, paged by offset or by next_cursor"""
     try:
         supabase = get_supabase_client()
         
-        query = supabase.table("loan_applications") \
-            .select("*") \
-            .range(offset, offset + limit - 1) \
-            .order("created_at", desc=True)
+        query = (
+            supabase.table("loan_applications")
+                .select("*")
+        )
         
-        if status:
-            query = query.eq("status", status)
+        if status_filter:
+            query = query.eq("status", status_filter)
         
-        response = query.execute()
+        response = await execute_query(paginate(query, limit, offset=offset, cursor=cursor))
         
-        applications = [LoanApplication(**app_data) for app_data in response.data]
+        rows, next_cursor = page_of(response.data, limit)
+        applications = [LoanApplication(**app_data) for app_data in rows]
         
         return APIResponse(
             success=True,
@@ -249,10 +304,16 @@ async def list_loan_applications(limit: int = 10, offset: int = 0, status: Optio
                 "total": len(applications),
                 "limit": limit,
                 "offset": offset,
-                "status_filter": status
+                "next_cursor": next_cursor,
+                "status_filter": status_filter
             }
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error listing loan applications: {e}")
         raise HTTPException(
@@ -266,11 +327,12 @@ async def delete_loan_application(application_id: str):
     try:
         supabase = get_supabase_client()
         
-        # Check if application exists
-        existing_app = supabase.table("loan_applications") \
-            .select("id") \
-            .eq("id", application_id) \
-            .execute()
+        # Check if application exists, keeping its current state for lender performance
+        existing_app = await execute_query(
+            supabase.table("loan_applications")
+                .select("id, status, matched_lenders, created_at, updated_at")
+                .eq("id", application_id)
+        )
         
         if not existing_app.data:
             raise HTTPException(
@@ -279,10 +341,13 @@ async def delete_loan_application(application_id: str):
             )
         
         # Delete application
-        response = supabase.table("loan_applications") \
-            .delete() \
-            .eq("id", application_id) \
-            .execute()
+        response = await execute_query(
+            supabase.table("loan_applications")
+                .delete()
+                .eq("id", application_id)
+        )
+        get_application_index().remove(application_id)
+        get_lender_performance_tracker().record_transition(existing_app.data[0], None)
         
         return APIResponse(
             success=True,
@@ -305,16 +370,18 @@ async def get_loan_analytics_summary():
         supabase = get_supabase_client()
         
         # Get total applications
-        total_response = supabase.table("loan_applications") \
-            .select("count", count="exact") \
-            .execute()
+        total_response = await execute_query(
+            supabase.table("loan_applications")
+                .select("count", count="exact")
+        )
         
         total_applications = total_response.count or 0
         
         # Get applications by status
-        status_response = supabase.table("loan_applications") \
-            .select("status") \
-            .execute()
+        status_response = await execute_query(
+            supabase.table("loan_applications")
+                .select("status")
+        )
         
         status_counts = {}
         for app in status_response.data:
@@ -1,16 +1,30 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Header, Request, status
 from typing import List, Optional
 import logging
 from datetime import datetime
 import uuid
 
 from app.models.schemas import PaymentCreate, Payment, APIResponse
-from app.database.connection import get_supabase_client
+from app.database.connection import get_supabase_client, execute_query
 from app.services.trust_score_service import TrustScoreService
+from app.services.model_registry import ModelNotReadyError
+from app.services.payment_feature_store import get_payment_feature_store
+from app.services.trust_score_cache import get_trust_score_cache
+from app.services.rescore_queue import request_rescore
+from app.utils.pagination import paginate, page_of, InvalidCursorError
+from app.services.payment_ingestion import ingest_payments
+from app.services.payment_import import SUPPORTED_FORMATS, start_payment_import, get_payment_import
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Content types accepted by the streaming import
+IMPORT_CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson"
+}
+
 @router.post("/payments/", response_model=APIResponse, status_code=status.HTTP_201_CREATED)
 async def create_payment(payment_data: PaymentCreate):
     """Record a new payment"""
@@ -18,10 +32,11 @@ async def create_payment(payment_data: PaymentCreate):
         supabase = get_supabase_client()
         
         # Verify user exists
-        user_response = supabase.table("users") \
-            .select("id") \
-            .eq("id", payment_data.user_id) \
-            .execute()
+        user_response = await execute_query(
+            supabase.table("users")
+                .select("id")
+                .eq("id", payment_data.user_id)
+        )
         
         if not user_response.data:
             raise HTTPException(
@@ -36,9 +51,10 @@ async def create_payment(payment_data: PaymentCreate):
         payment_dict["updated_at"] = datetime.now().isoformat()
         
         # Insert payment
-        response = supabase.table("payments") \
-            .insert(payment_dict) \
-            .execute()
+        response = await execute_query(
+            supabase.table("payments")
+                .insert(payment_dict)
+        )
         
         if not response.data:
             raise HTTPException(
@@ -47,10 +63,11 @@ async def create_payment(payment_data: PaymentCreate):
             )
         
         created_payment = Payment(**response.data[0])
+        get_payment_feature_store().apply_created(response.data[0])
+        get_trust_score_cache().invalidate(payment_data.user_id)
         
-        # Recalculate trust score after new payment
-        trust_service = TrustScoreService()
-        await trust_service.calculate_trust_score(payment_data.user_id)
+        # Recalculate trust score in the background after new payment
+        await request_rescore(payment_data.user_id)
         
         return APIResponse(
             success=True,
@@ -73,11 +90,12 @@ async def get_payment(payment_id: str):
     try:
         supabase = get_supabase_client()
         
-        response = supabase.table("payments") \
-            .select("*") \
-            .eq("id", payment_id) \
-            .single() \
-            .execute()
+        response = await execute_query(
+            supabase.table("payments")
+                .select("*")
+                .eq("id", payment_id)
+                .single()
+        )
         
         if not response.data:
             raise HTTPException(
@@ -103,16 +121,17 @@ async def get_payment(payment_id: str):
         )
 
 @router.get("/payments/user/{user_id}", response_model=APIResponse)
-async def get_user_payments(user_id: str, limit: int = 50, offset: int = 0):
-    """Get all payments for a user"""
+async def get_user_payments(user_id: str, limit: int = 50, offset: int = 0, cursor: Optional[str] = None):
+    """Get all payments for a user, paged by offset or by the previous page's next_cursor"""
     try:
         supabase = get_supabase_client()
         
         # Verify user exists
-        user_response = supabase.table("users") \
-            .select("id") \
-            .eq("id", user_id) \
-            .execute()
+        user_response = await execute_query(
+            supabase.table("users")
+                .select("id")
+                .eq("id", user_id)
+        )
         
         if not user_response.data:
             raise HTTPException(
@@ -120,14 +139,15 @@ async def get_user_payments(user_id: str, limit: int = 50, offset: int = 0):
                 detail="User not found"
             )
         
-        response = supabase.table("payments") \
-            .select("*") \
-            .eq("user_id", user_id) \
-            .order("created_at", desc=True) \
-            .range(offset, offset + limit - 1) \
-            .execute()
+        query = (
+            supabase.table("payments")
+                .select("*")
+                .eq("user_id", user_id)
+        )
+        response = await execute_query(paginate(query, limit, offset=offset, cursor=cursor))
         
-        payments = [Payment(**payment_data) for payment_data in response.data]
+        rows, next_cursor = page_of(response.data, limit)
+        payments = [Payment(**payment_data) for payment_data in rows]
         
         return APIResponse(
             success=True,
@@ -136,12 +156,18 @@ async def get_user_payments(user_id: str, limit: int = 50, offset: int = 0):
                 "payments": payments,
                 "total": len(payments),
                 "limit": limit,
-                "offset": offset
+                "offset": offset,
+                "next_cursor": next_cursor
             }
         )
         
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error getting payments for user {user_id}: {e}")
         raise HTTPException(
@@ -156,10 +182,11 @@ async def update_payment(payment_id: str, payment_data: dict):
         supabase = get_supabase_client()
         
         # Check if payment exists
-        existing_payment = supabase.table("payments") \
-            .select("id, user_id") \
-            .eq("id", payment_id) \
-            .execute()
+        existing_payment = await execute_query(
+            supabase.table("payments")
+                .select("*")
+                .eq("id", payment_id)
+        )
         
         if not existing_payment.data:
             raise HTTPException(
@@ -172,10 +199,11 @@ async def update_payment(payment_id: str, payment_data: dict):
         update_data["updated_at"] = datetime.now().isoformat()
         
         # Update payment
-        response = supabase.table("payments") \
-            .update(update_data) \
-            .eq("id", payment_id) \
-            .execute()
+        response = await execute_query(
+            supabase.table("payments")
+                .update(update_data)
+                .eq("id", payment_id)
+        )
         
         if not response.data:
             raise HTTPException(
@@ -184,12 +212,14 @@ async def update_payment(payment_id: str, payment_data: dict):
             )
         
         updated_payment = Payment(**response.data[0])
+        get_payment_feature_store().apply_updated(existing_payment.data[0], response.data[0])
+        for affected_user_id in {existing_payment.data[0]['user_id'], response.data[0]['user_id']}:
+            get_trust_score_cache().invalidate(affected_user_id)
         
         # Recalculate trust score if payment status changed
         if 'status' in update_data:
-            user_id = existing_payment.data[0]['user_id']
-            trust_service = TrustScoreService()
-            await trust_service.calculate_trust_score(user_id)
+            for affected_user_id in {existing_payment.data[0]['user_id'], response.data[0]['user_id']}:
+                await request_rescore(affected_user_id)
         
         return APIResponse(
             success=True,
@@ -213,10 +243,11 @@ async def delete_payment(payment_id: str):
         supabase = get_supabase_client()
         
         # Get payment details before deletion
-        payment_response = supabase.table("payments") \
-            .select("user_id") \
-            .eq("id", payment_id) \
-            .execute()
+        payment_response = await execute_query(
+            supabase.table("payments")
+                .select("*")
+                .eq("id", payment_id)
+        )
         
         if not payment_response.data:
             raise HTTPException(
@@ -227,14 +258,16 @@ async def delete_payment(payment_id: str):
         user_id = payment_response.data[0]['user_id']
         
         # Delete payment
-        response = supabase.table("payments") \
-            .delete() \
-            .eq("id", payment_id) \
-            .execute()
+        response = await execute_query(
+            supabase.table("payments")
+                .delete()
+                .eq("id", payment_id)
+        )
+        get_payment_feature_store().apply_deleted(payment_response.data[0])
+        get_trust_score_cache().invalidate(user_id)
         
-        # Recalculate trust score after payment deletion
-        trust_service = TrustScoreService()
-        await trust_service.calculate_trust_score(user_id)
+        # Recalculate trust score in the background after payment deletion
+        await request_rescore(user_id)
         
         return APIResponse(
             success=True,
@@ -259,57 +292,16 @@ async def get_payment_analysis(user_id: str):
         # Get payment behavior analysis
         analysis = await trust_service.analyze_payment_behavior(user_id)
         
-        # Get payment history summary
-        supabase = get_supabase_client()
-        payments_response = supabase.table("payments") \
-            .select("*") \
-            .eq("user_id", user_id) \
-            .order("created_at", desc=True) \
-            .execute()
-        
-        payments = payments_response.data
-        
-        # Calculate additional metrics
-        if payments:
-            # Payment trends over time
-            monthly_payments = {}
-            for payment in payments:
-                month = payment['created_at'][:7]  # YYYY-MM
-                if month not in monthly_payments:
-                    monthly_payments[month] = {
-                        'total': 0,
-                        'count': 0,
-                        'on_time': 0,
-                        'late': 0,
-                        'missed': 0
-                    }
-                
-                monthly_payments[month]['total'] += payment['amount']
-                monthly_payments[month]['count'] += 1
-                
-                if payment['status'] == 'on_time':
-                    monthly_payments[month]['on_time'] += 1
-                elif payment['status'] == 'late':
-                    monthly_payments[month]['late'] += 1
-                elif payment['status'] == 'missed':
-                    monthly_payments[month]['missed'] += 1
-            
-            # Loan type distribution
-            loan_type_distribution = {}
-            for payment in payments:
-                loan_type = payment['loan_type']
-                if loan_type not in loan_type_distribution:
-                    loan_type_distribution[loan_type] = 0
-                loan_type_distribution[loan_type] += 1
-        else:
-            monthly_payments = {}
-            loan_type_distribution = {}
+        # Monthly trends and loan type mix come from the same payment aggregate
+        payments = await get_payment_feature_store().get(user_id)
+        monthly_payments = payments.monthly_trends()
+        loan_type_distribution = dict(payments.loan_type_counts)
         
         analysis_data = {
             "behavior_analysis": analysis,
             "monthly_trends": monthly_payments,
             "loan_type_distribution": loan_type_distribution,
-            "total_payments": len(payments),
+            "total_payments": payments.total_count,
             "analysis_date": datetime.now().isoformat()
         }
         
@@ -321,6 +313,11 @@ async def get_payment_analysis(user_id: str):
         
     except HTTPException:
         raise
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error getting payment analysis for user {user_id}: {e}")
         raise HTTPException(
@@ -329,67 +326,104 @@ async def get_payment_analysis(user_id: str):
         )
 
 @router.post("/payments/bulk", response_model=APIResponse, status_code=status.HTTP_201_CREATED)
-async def create_bulk_payments(payments_data: List[PaymentCreate]):
-    """Create multiple payments at once"""
+async def create_bulk_payments(payments_data: List[dict],
+                               idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """
+    Create multiple payments at once
+    
+    Rows are validated and inserted independently; invalid rows and rows of unknown
+    users are reported by index instead of failing the request. Replaying a request
+    with the same Idempotency-Key never inserts a row twice.
+    """
     try:
-        supabase = get_supabase_client()
+        report = await ingest_payments(payments_data, idempotency_key=idempotency_key)
         
-        # Validate all users exist
-        user_ids = list(set(payment.user_id for payment in payments_data))
-        for user_id in user_ids:
-            user_response = supabase.table("users") \
-                .select("id") \
-                .eq("id", user_id) \
-                .execute()
-            
-            if not user_response.data:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"User {user_id} not found"
-                )
-        
-        # Prepare payments data
-        payments_to_insert = []
-        for payment_data in payments_data:
-            payment_dict = payment_data.dict()
-            payment_dict["id"] = str(uuid.uuid4())
-            payment_dict["created_at"] = datetime.now().isoformat()
-            payment_dict["updated_at"] = datetime.now().isoformat()
-            payments_to_insert.append(payment_dict)
-        
-        # Insert payments
-        response = supabase.table("payments") \
-            .insert(payments_to_insert) \
-            .execute()
+        return APIResponse(
+            success=report['failed'] == 0,
+            message=f"Created {report['inserted']} of {report['total_rows']} payments",
+            data=report
+        )
         
-        if not response.data:
+    except Exception as e:
+        logger.error(f"Error creating bulk payments: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.post("/payments/import", response_model=APIResponse, status_code=status.HTTP_201_CREATED)
+async def import_payments(request: Request, format: Optional[str] = None,
+                          idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """
+    Stream a CSV or NDJSON payment file into the payments table
+    
+    The format comes from `format` or the Content-Type (text/csv, application/x-ndjson).
+    The Idempotency-Key header is required and doubles as the import id, so the
+    client can follow progress at GET /payments/import/{import_id} while the
+    upload runs, and a re-sent file never inserts a row twice.
+    """
+    try:
+        if not idempotency_key:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to create payments"
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Idempotency-Key header is required; it is the import id used for progress"
             )
         
-        created_payments = [Payment(**payment_data) for payment_data in response.data]
+        file_format = format or IMPORT_CONTENT_TYPES.get(
+            request.headers.get("content-type", "").split(";")[0].strip().lower()
+        )
+        if file_format not in SUPPORTED_FORMATS:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Import format must be one of: {', '.join(SUPPORTED_FORMATS)}"
+            )
         
-        # Recalculate trust scores for affected users
-        trust_service = TrustScoreService()
-        affected_users = list(set(payment.user_id for payment in created_payments))
-        for user_id in affected_users:
-            await trust_service.calculate_trust_score(user_id)
+        existing_import = get_payment_import(idempotency_key)
+        if existing_import is not None and existing_import.status in ("running", "rescoring"):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Import {idempotency_key} is already running"
+            )
+        
+        payment_import = start_payment_import(file_format, import_id=idempotency_key)
+        progress = await payment_import.run(request.stream())
+        
+        return APIResponse(
+            success=progress['failed'] == 0,
+            message=f"Imported {progress['inserted']} of {progress['total_rows']} payments",
+            data=progress
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error importing payments: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.get("/payments/import/{import_id}", response_model=APIResponse)
+async def get_import_progress(import_id: str):
+    """Get progress and throughput of a payment import"""
+    try:
+        payment_import = get_payment_import(import_id)
+        if payment_import is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Import not found"
+            )
         
         return APIResponse(
             success=True,
-            message=f"Created {len(created_payments)} payments successfully",
-            data={
-                "payments": created_payments,
-                "total_created": len(created_payments),
-                "affected_users": len(affected_users)
-            }
+            message="Import progress retrieved successfully",
+            data=payment_import.progress()
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error creating bulk payments: {e}")
+        logger.error(f"Error getting import progress {import_id}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -3,8 +3,11 @@ from typing import List, Optional
 import logging
 from datetime import datetime
 
-from app.models.schemas import TrustScoreRequest, APIResponse
+from app.models.schemas import TrustScoreRequest, TrustScoreBatchRequest, APIResponse
 from app.services.trust_score_service import TrustScoreService
+from app.services.model_registry import ModelNotReadyError
+from app.services.model_training_jobs import TrainingCapacityError
+from app.services.rescore_queue import get_rescore_queue
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -31,6 +34,11 @@ async def calculate_trust_score(request: TrustScoreRequest):
             status_code=status.HTTP_404_NOT_FOUND,
             detail=str(e)
         )
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error calculating trust score: {e}")
         raise HTTPException(
@@ -38,6 +46,36 @@ async def calculate_trust_score(request: TrustScoreRequest):
             detail="Internal server error"
         )
 
+@router.post("/trust-score/calculate/batch", response_model=APIResponse)
+async def calculate_trust_scores_batch(request: TrustScoreBatchRequest):
+    """Calculate trust scores for many users in one pass"""
+    try:
+        trust_service = TrustScoreService()
+        
+        result = await trust_service.calculate_trust_scores_batch(
+            request.user_ids,
+            include_payment_history=request.include_payment_history
+        )
+        
+        return APIResponse(
+            success=True,
+            message=f"Calculated {result['total_scored']} trust scores",
+            data=result,
+            errors=[f"User {user_id} not found" for user_id in result['missing_user_ids']] or None
+        )
+        
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error calculating batch trust scores: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
 @router.get("/trust-score/{user_id}", response_model=APIResponse)
 async def get_trust_score(user_id: str):
     """Get the latest trust score for a user"""
@@ -106,6 +144,11 @@ async def get_payment_behavior_analysis(user_id: str):
             data=analysis
         )
         
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error getting payment analysis for user {user_id}: {e}")
         raise HTTPException(
@@ -127,6 +170,11 @@ async def get_model_performance():
             data=performance
         )
         
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error getting model performance: {e}")
         raise HTTPException(
@@ -134,23 +182,126 @@ async def get_model_performance():
             detail="Internal server error"
         )
 
-@router.post("/trust-score/model/retrain", response_model=APIResponse)
+@router.post("/trust-score/model/retrain", response_model=APIResponse, status_code=status.HTTP_202_ACCEPTED)
 async def retrain_model(training_data: List[dict]):
-    """Retrain the trust score model with new data"""
+    """Start retraining the trust score model with new data"""
     try:
         trust_service = TrustScoreService()
         
-        results = await trust_service.retrain_model(training_data)
+        job = await trust_service.retrain_model(training_data)
         
         return APIResponse(
             success=True,
-            message="Model retraining completed successfully",
-            data=results
+            message="Model retraining job started",
+            data=job
         )
         
+    except TrainingCapacityError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error retraining model: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
         )
+
+@router.get("/trust-score/model/jobs/{job_id}", response_model=APIResponse)
+async def get_retraining_job(job_id: str):
+    """Get progress and metrics of a retraining job"""
+    try:
+        trust_service = TrustScoreService()
+        
+        job = await trust_service.get_retraining_job(job_id)
+        
+        if not job:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Retraining job not found"
+            )
+        
+        return APIResponse(
+            success=True,
+            message=f"Retraining job is {job['status']}",
+            data=job
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting retraining job {job_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.get("/trust-score/model/versions", response_model=APIResponse)
+async def list_model_versions():
+    """List saved trust score model versions"""
+    try:
+        trust_service = TrustScoreService()
+        
+        versions = await trust_service.list_model_versions()
+        
+        return APIResponse(
+            success=True,
+            message=f"Retrieved {len(versions)} model versions",
+            data={"versions": versions}
+        )
+        
+    except Exception as e:
+        logger.error(f"Error listing model versions: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.post("/trust-score/model/versions/{version}/promote", response_model=APIResponse)
+async def promote_model_version(version: str):
+    """Promote a saved model version to serve new requests"""
+    try:
+        trust_service = TrustScoreService()
+        
+        manifest = await trust_service.promote_model_version(version)
+        
+        return APIResponse(
+            success=True,
+            message=f"Model version {version} promoted",
+            data=manifest
+        )
+        
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error promoting model version {version}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+@router.get("/trust-score/service/metrics", response_model=APIResponse)
+async def get_service_metrics():
+    """Get trust score service runtime metrics"""
+    try:
+        trust_service = TrustScoreService()
+        
+        metrics = trust_service.get_service_metrics()
+        metrics['rescore_queue'] = get_rescore_queue().stats()
+        
+        return APIResponse(
+            success=True,
+            message="Service metrics retrieved successfully",
+            data=metrics
+        )
+        
+    except Exception as e:
+        logger.error(f"Error getting service metrics: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
@@ -5,8 +5,14 @@ from datetime import datetime
 import uuid
 
 from app.models.schemas import UserCreate, UserUpdate, User, APIResponse
-from app.database.connection import get_supabase_client
+from app.database.connection import get_supabase_client, execute_query
 from app.services.trust_score_service import TrustScoreService
+from app.services.model_registry import ModelNotReadyError
+from app.services.payment_feature_store import get_payment_feature_store
+from app.services.trust_score_cache import get_trust_score_cache
+from app.services.rescore_queue import request_rescore
+from app.utils.pagination import paginate, page_of, InvalidCursorError
+from app.utils.concurrency import gather_all
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -18,10 +24,11 @@ async def create_user(user_data: UserCreate):
         supabase = get_supabase_client()
         
         # Check if user already exists
-        existing_user = supabase.table("users") \
-            .select("id") \
-            .eq("email", user_data.email) \
-            .execute()
+        existing_user = await execute_query(
+            supabase.table("users")
+                .select("id")
+                .eq("email", user_data.email)
+        )
         
         if existing_user.data:
             raise HTTPException(
@@ -39,9 +46,10 @@ async def create_user(user_data: UserCreate):
         user_dict.pop("password", None)
         
         # Insert user
-        response = supabase.table("users") \
-            .insert(user_dict) \
-            .execute()
+        response = await execute_query(
+            supabase.table("users")
+                .insert(user_dict)
+        )
         
         if not response.data:
             raise HTTPException(
@@ -51,9 +59,8 @@ async def create_user(user_data: UserCreate):
         
         created_user = User(**response.data[0])
         
-        # Calculate initial trust score
-        trust_service = TrustScoreService()
-        await trust_service.calculate_trust_score(created_user.id)
+        # Calculate initial trust score in the background
+        await request_rescore(created_user.id)
         
         return APIResponse(
             success=True,
@@ -76,11 +83,12 @@ async def get_user(user_id: str):
     try:
         supabase = get_supabase_client()
         
-        response = supabase.table("users") \
-            .select("*") \
-            .eq("id", user_id) \
-            .single() \
-            .execute()
+        response = await execute_query(
+            supabase.table("users")
+                .select("*")
+                .eq("id", user_id)
+                .single()
+        )
         
         if not response.data:
             raise HTTPException(
@@ -112,10 +120,11 @@ async def update_user(user_id: str, user_data: UserUpdate):
         supabase = get_supabase_client()
         
         # Check if user exists
-        existing_user = supabase.table("users") \
-            .select("id") \
-            .eq("id", user_id) \
-            .execute()
+        existing_user = await execute_query(
+            supabase.table("users")
+                .select("id")
+                .eq("id", user_id)
+        )
         
         if not existing_user.data:
             raise HTTPException(
@@ -128,10 +137,11 @@ async def update_user(user_id: str, user_data: UserUpdate):
         update_data["updated_at"] = datetime.now().isoformat()
         
         # Update user
-        response = supabase.table("users") \
-            .update(update_data) \
-            .eq("id", user_id) \
-            .execute()
+        response = await execute_query(
+            supabase.table("users")
+                .update(update_data)
+                .eq("id", user_id)
+        )
         
         if not response.data:
             raise HTTPException(
@@ -143,8 +153,8 @@ async def update_user(user_id: str, user_data: UserUpdate):
         
         # Recalculate trust score if relevant fields were updated
         if any(field in update_data for field in ['income', 'employment_status', 'credit_score']):
-            trust_service = TrustScoreService()
-            await trust_service.calculate_trust_score(user_id)
+            get_trust_score_cache().invalidate(user_id)
+            await request_rescore(user_id)
         
         return APIResponse(
             success=True,
@@ -168,10 +178,11 @@ async def delete_user(user_id: str):
         supabase = get_supabase_client()
         
         # Check if user exists
-        existing_user = supabase.table("users") \
-            .select("id") \
-            .eq("id", user_id) \
-            .execute()
+        existing_user = await execute_query(
+            supabase.table("users")
+                .select("id")
+                .eq("id", user_id)
+        )
         
         if not existing_user.data:
             raise HTTPException(
@@ -180,10 +191,13 @@ async def delete_user(user_id: str):
             )
         
         # Delete user (in production, you might want to soft delete)
-        response = supabase.table("users") \
-            .delete() \
-            .eq("id", user_id) \
-            .execute()
+        response = await execute_query(
+            supabase.table("users")
+                .delete()
+                .eq("id", user_id)
+        )
+        get_payment_feature_store().invalidate(user_id)
+        get_trust_score_cache().invalidate(user_id)
         
         return APIResponse(
             success=True,
@@ -200,18 +214,19 @@ async def delete_user(user_id: str):
         )
 
 @router.get("/users/", response_model=APIResponse)
-async def list_users(limit: int = 10, offset: int = 0):
-    """List users with pagination"""
+async def list_users(limit: int = 10, offset: int = 0, cursor: Optional[str] = None):
+    """List users with pagination, by offset or by the previous page's next_cursor"""
     try:
         supabase = get_supabase_client()
         
-        response = supabase.table("users") \
-            .select("*") \
-            .range(offset, offset + limit - 1) \
-            .order("created_at", desc=True) \
-            .execute()
+        query = (
+            supabase.table("users")
+                .select("*")
+        )
+        response = await execute_query(paginate(query, limit, offset=offset, cursor=cursor))
         
-        users = [User(**user_data) for user_data in response.data]
+        rows, next_cursor = page_of(response.data, limit)
+        users = [User(**user_data) for user_data in rows]
         
         return APIResponse(
             success=True,
@@ -220,10 +235,16 @@ async def list_users(limit: int = 10, offset: int = 0):
                 "users": users,
                 "total": len(users),
                 "limit": limit,
-                "offset": offset
+                "offset": offset,
+                "next_cursor": next_cursor
             }
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error listing users: {e}")
         raise HTTPException(
@@ -238,12 +259,24 @@ async def get_user_profile(user_id: str):
         supabase = get_supabase_client()
         trust_service = TrustScoreService()
         
-        # Get user data
-        user_response = supabase.table("users") \
-            .select("*") \
-            .eq("id", user_id) \
-            .single() \
-            .execute()
+        # Fetch the user, trust score, payment analysis and recent payments concurrently
+        user_response, trust_score, payment_analysis, payments_response = await gather_all(
+            execute_query(
+                supabase.table("users")
+                    .select("*")
+                    .eq("id", user_id)
+                    .single()
+            ),
+            trust_service.get_trust_score(user_id),
+            trust_service.analyze_payment_behavior(user_id),
+            execute_query(
+                supabase.table("payments")
+                    .select("*")
+                    .eq("user_id", user_id)
+                    .order("created_at", desc=True)
+                    .limit(5)
+            )
+        )
         
         if not user_response.data:
             raise HTTPException(
@@ -253,20 +286,6 @@ async def get_user_profile(user_id: str):
         
         user = User(**user_response.data)
         
-        # Get trust score
-        trust_score = await trust_service.get_trust_score(user_id)
-        
-        # Get payment behavior analysis
-        payment_analysis = await trust_service.analyze_payment_behavior(user_id)
-        
-        # Get recent payments
-        payments_response = supabase.table("payments") \
-            .select("*") \
-            .eq("user_id", user_id) \
-            .order("created_at", desc=True) \
-            .limit(5) \
-            .execute()
-        
         profile_data = {
             "user": user,
             "trust_score": trust_score,
@@ -282,6 +301,11 @@ async def get_user_profile(user_id: str):
         
     except HTTPException:
         raise
+    except ModelNotReadyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error getting user profile {user_id}: {e}")
         raise HTTPException(
@@ -0,0 +1,77 @@
+"""
+Throughput of `execute_query` as the number of in-flight queries grows
+
+Each fake query blocks its thread for 50 ms, like a PostgREST round trip, so
+throughput should rise with concurrency until DB_MAX_CONCURRENCY threads are
+busy and then stay flat. A second run gives every query a timeout just above
+its own execution time while twice the pool size are in flight; none may time
+out, since time spent waiting for a thread is not charged to the query.
+
+Run from the repository root:
+
+    python "AI Engine/benchmarks/execute_query_concurrency.py"
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+import time
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _import_app():
+    """Make the AI Engine directory importable as `app`, as it is when deployed"""
+    if importlib.util.find_spec("app") is None:
+        spec = importlib.util.spec_from_file_location(
+            "app", os.path.join(ENGINE_DIR, "__init__.py"), submodule_search_locations=[ENGINE_DIR]
+        )
+        sys.modules["app"] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules["app"])
+
+_import_app()
+
+from app.database.connection import DB_MAX_CONCURRENCY, execute_query, close_database
+
+class FakeQuery:
+    """Stands in for a supabase query builder whose request takes `latency` seconds"""
+    
+    def __init__(self, latency: float):
+        self.latency = latency
+    
+    def execute(self):
+        time.sleep(self.latency)
+        return self
+
+async def measure(in_flight: int, rounds: int, latency: float) -> float:
+    """Queries per second with `in_flight` queries issued at once, `rounds` times"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(execute_query(FakeQuery(latency)) for _ in range(in_flight)))
+    return in_flight * rounds / (time.perf_counter() - started)
+
+async def count_timeouts(queries: int, latency: float, timeout: float) -> int:
+    results = await asyncio.gather(
+        *(execute_query(FakeQuery(latency), timeout=timeout) for _ in range(queries)),
+        return_exceptions=True
+    )
+    return sum(isinstance(result, TimeoutError) for result in results)
+
+async def main(latency: float, rounds: int):
+    print(f"{latency * 1000:.0f} ms queries, DB_MAX_CONCURRENCY={DB_MAX_CONCURRENCY}")
+    print(f"{'in flight':>10} {'queries/s':>10} {'ideal':>10}")
+    for in_flight in (1, 2, 4, 8, 16, 32, 64, 128):
+        ideal = min(in_flight, DB_MAX_CONCURRENCY) / latency
+        print(f"{in_flight:>10} {await measure(in_flight, rounds, latency):>10.1f} {ideal:>10.1f}")
+    
+    queries = 2 * DB_MAX_CONCURRENCY
+    timed_out = await count_timeouts(queries, latency, timeout=latency * 1.5)
+    print(f"{timed_out} of {queries} queued queries timed out with a {latency * 1.5 * 1000:.0f} ms timeout")
+    close_database()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each fake query blocks")
+    parser.add_argument("--rounds", type=int, default=4, help="batches issued per concurrency level")
+    args = parser.parse_args()
+    asyncio.run(main(args.latency, args.rounds))
@@ -0,0 +1,228 @@
+"""
+Parity and timing of vectorized lender scoring against the scalar formulas
+
+Random lenders are loaded into LenderColumns for each loan type and random
+requests are scored both ways. The scalar reference below is the per-lender
+matching code that LenderColumns replaced; every eligible lender's match score,
+interest rate and requirement check must be identical, and the top matches must
+come out in the same order. Times are per request, including ranking.
+
+Run from the repository root:
+
+    python "AI Engine/benchmarks/lender_scoring_benchmark.py" --lenders 10000 100000
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _import_app():
+    """Make the AI Engine directory importable as `app`, as it is when deployed"""
+    if importlib.util.find_spec("app") is None:
+        spec = importlib.util.spec_from_file_location(
+            "app", os.path.join(ENGINE_DIR, "__init__.py"), submodule_search_locations=[ENGINE_DIR]
+        )
+        sys.modules["app"] = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(sys.modules["app"])
+
+_import_app()
+
+from app.services.lender_scoring import LenderColumns, select_matches
+
+LOAN_TYPES = ["personal", "auto", "business", "mortgage", "student"]
+
+def reference_score(lender: Dict[str, Any], trust_score: float, loan_amount: float,
+                    loan_type: str, term_months: int) -> Tuple[float, float, bool]:
+    """Match score, interest rate and requirement check of one lender, as the scalar code computed them"""
+    min_trust = lender.get('min_trust_score', 0)
+    if trust_score < min_trust:
+        trust_weight = 0.0
+    elif trust_score >= 800:
+        trust_weight = 1.0
+    elif trust_score >= 650:
+        trust_weight = 0.9
+    elif trust_score >= 500:
+        trust_weight = 0.7
+    elif trust_score >= 300:
+        trust_weight = 0.5
+    else:
+        trust_weight = 0.3
+    
+    max_amount = lender.get('max_loan_amount', 0)
+    if loan_amount > max_amount:
+        amount_weight = 0.0
+    else:
+        utilization = loan_amount / max_amount
+        amount_weight = 1.0 if utilization <= 0.5 else 0.8 if utilization <= 0.8 else 0.6
+    
+    type_weight = 1.0 if loan_type in lender.get('loan_types', []) else 0.0
+    
+    if 12 <= term_months <= 60:
+        term_weight = 1.0
+    elif 6 <= term_months <= 84:
+        term_weight = 0.8
+    else:
+        term_weight = 0.5
+    
+    score = 0.0
+    score += trust_weight * 0.4
+    score += amount_weight * 0.25
+    score += type_weight * 0.2
+    score += term_weight * 0.15
+    
+    rate_range = lender.get('interest_rate_range', {})
+    min_rate = rate_range.get('min', 5.0)
+    max_rate = rate_range.get('max', 25.0)
+    if trust_score >= 800:
+        rate_multiplier = 0.8
+    elif trust_score >= 650:
+        rate_multiplier = 0.9
+    elif trust_score >= 500:
+        rate_multiplier = 1.0
+    elif trust_score >= 300:
+        rate_multiplier = 1.1
+    else:
+        rate_multiplier = 1.2
+    if loan_amount >= 50000:
+        amount_multiplier = 0.95
+    elif loan_amount >= 25000:
+        amount_multiplier = 0.98
+    else:
+        amount_multiplier = 1.0
+    if term_months <= 12:
+        term_multiplier = 0.95
+    elif term_months <= 36:
+        term_multiplier = 1.0
+    else:
+        term_multiplier = 1.05
+    final_rate = (min_rate + max_rate) / 2 * rate_multiplier * amount_multiplier * term_multiplier
+    interest_rate = max(min_rate, min(max_rate, final_rate))
+    
+    requirements = lender.get('requirements', {})
+    supported_types = requirements.get('supported_loan_types', [])
+    requirements_met = trust_score >= requirements.get('min_trust_score', 0) and \
+        not (supported_types and loan_type not in supported_types)
+    
+    return score, interest_rate, requirements_met
+
+def random_lender(rng: random.Random, index: int) -> Dict[str, Any]:
+    """A lender mixing common round values with arbitrary floats, to hit every band edge"""
+    return {
+        'id': f"lender-{index}",
+        'name': f"Lender {index}",
+        'min_trust_score': rng.choice([0, 300, 500, 600, 650, 700, 750, rng.randint(0, 1000), rng.uniform(0, 1000)]),
+        'max_loan_amount': rng.choice([15000, 25000, 50000, 100000, rng.randint(1, 500000), rng.uniform(1, 5e5)]),
+        'interest_rate_range': {
+            'min': rng.choice([3.5, 4.5, 5, 8.0, rng.uniform(1, 20)]),
+            'max': rng.choice([8.0, 12, 15.0, 25.0, rng.uniform(5, 40)])
+        },
+        'loan_types': rng.sample(LOAN_TYPES, rng.randint(1, 3)),
+        'requirements': rng.choice([
+            {},
+            {'min_trust_score': rng.randint(0, 900)},
+            {'supported_loan_types': rng.sample(LOAN_TYPES, 2), 'min_trust_score': 500}
+        ])
+    }
+
+def random_request(rng: random.Random) -> Tuple[float, float, str, int]:
+    return (
+        rng.choice([rng.uniform(0, 1000), 300, 500, 650, 800, rng.randint(0, 1000)]),
+        rng.choice([25000, 50000, rng.uniform(1, 6e5), rng.randint(1, 6e5)]),
+        rng.choice(LOAN_TYPES),
+        rng.choice([3, 6, 12, 36, 60, 84, 120, rng.randint(1, 360)])
+    )
+
+def vectorized_top(columns: LenderColumns, request: Tuple[float, float, str, int],
+                   limit: int) -> List[Tuple[str, float, float, bool]]:
+    trust_score, loan_amount, _, term_months = request
+    rows = columns.eligible(trust_score, loan_amount)
+    match_scores, interest_rates, requirements_met = columns.score(rows, trust_score, loan_amount, term_months)
+    positive = match_scores > 0
+    rows, match_scores = rows[positive], match_scores[positive]
+    interest_rates, requirements_met = interest_rates[positive], requirements_met[positive]
+    selected = select_matches(match_scores, columns.sequence[rows], limit)
+    return [
+        (columns.lenders[rows[i]]['id'], float(match_scores[i]), float(interest_rates[i]), bool(requirements_met[i]))
+        for i in selected
+    ]
+
+def scalar_top(lenders: List[Dict[str, Any]], request: Tuple[float, float, str, int],
+               limit: int) -> List[Tuple[str, float, float, bool]]:
+    trust_score, loan_amount, loan_type, term_months = request
+    matches = []
+    for lender in lenders:
+        # Lenders the index would not return for this request
+        if lender['min_trust_score'] > trust_score or lender['max_loan_amount'] < loan_amount or \
+                loan_type not in lender['loan_types']:
+            continue
+        match_score, interest_rate, requirements_met = reference_score(
+            lender, trust_score, loan_amount, loan_type, term_months
+        )
+        if match_score > 0:
+            matches.append((lender['id'], match_score, interest_rate, requirements_met))
+    # Stable sort on the reported score keeps load order among ties
+    matches.sort(key=lambda match: round(match[1], 3), reverse=True)
+    return matches[:limit]
+
+def check_every_row(columns: LenderColumns, request: Tuple[float, float, str, int]) -> int:
+    """Compare each eligible lender's scores exactly; returns the number compared"""
+    trust_score, loan_amount, loan_type, term_months = request
+    rows = columns.eligible(trust_score, loan_amount)
+    match_scores, interest_rates, requirements_met = columns.score(rows, trust_score, loan_amount, term_months)
+    for position, row in enumerate(rows):
+        expected = reference_score(columns.lenders[row], trust_score, loan_amount, loan_type, term_months)
+        actual = (float(match_scores[position]), float(interest_rates[position]), bool(requirements_met[position]))
+        assert actual == expected, (columns.lenders[row]['id'], request, actual, expected)
+    return len(rows)
+
+def run(n_lenders: int, requests: int, limit: int, seed: int):
+    rng = random.Random(seed)
+    lenders = [random_lender(rng, index) for index in range(n_lenders)]
+    columns = {
+        loan_type: LenderColumns(
+            [lender for lender in lenders if loan_type in lender['loan_types']],
+            loan_type,
+            [index for index, lender in enumerate(lenders) if loan_type in lender['loan_types']]
+        )
+        for loan_type in LOAN_TYPES
+    }
+    
+    compared = 0
+    vectorized_seconds = scalar_seconds = 0.0
+    for _ in range(requests):
+        request = random_request(rng)
+        loan_columns = columns[request[2]]
+        compared += check_every_row(loan_columns, request)
+        
+        started = time.perf_counter()
+        top = vectorized_top(loan_columns, request, limit)
+        vectorized_seconds += time.perf_counter() - started
+        
+        started = time.perf_counter()
+        expected = scalar_top(lenders, request, limit)
+        scalar_seconds += time.perf_counter() - started
+        
+        assert top == expected, request
+    
+    print(
+        f"{n_lenders:>8} lenders  {compared:>9} scores identical  "
+        f"vectorized {vectorized_seconds / requests * 1000:8.2f} ms  "
+        f"scalar {scalar_seconds / requests * 1000:8.2f} ms  "
+        f"speedup {scalar_seconds / vectorized_seconds:6.1f}x"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lenders", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--requests", type=int, default=50, help="random requests per lender count")
+    parser.add_argument("--limit", type=int, default=10, help="top matches compared per request")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    
+    for n_lenders in args.lenders:
+        run(n_lenders, args.requests, args.limit, args.seed)
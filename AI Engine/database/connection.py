@@ -1,13 +1,30 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
-from typing import Optional
+from typing import Any, List, Optional
 import logging
 
+from app.utils.concurrency import gather_all
+
 logger = logging.getLogger(__name__)
 
+# Queries run on a bounded thread pool so they never block the event loop
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "32"))
+DB_QUERY_TIMEOUT_SECONDS = float(os.getenv("DB_QUERY_TIMEOUT_SECONDS", "10"))
+
+# Ids per `in_` filter, keeping request URLs well within PostgREST limits
+IN_FILTER_CHUNK_SIZE = 200
+
 # Global Supabase client
 supabase: Optional[Client] = None
 
+# Global database I/O executor
+db_executor: Optional[ThreadPoolExecutor] = None
+
+# Free executor threads; a query holds one until its `.execute()` returns
+db_slots: Optional[asyncio.Semaphore] = None
+
 def get_supabase_client() -> Client:
     """Get Supabase client instance"""
     global supabase
@@ -23,13 +40,91 @@ def get_supabase_client() -> Client:
     
     return supabase
 
+def get_db_executor() -> ThreadPoolExecutor:
+    """Get the thread pool that runs database queries"""
+    global db_executor
+    if db_executor is None:
+        db_executor = ThreadPoolExecutor(max_workers=DB_MAX_CONCURRENCY, thread_name_prefix="db-io")
+    
+    return db_executor
+
+def get_db_slots() -> asyncio.Semaphore:
+    """Get the semaphore that admits queries to the database executor"""
+    global db_slots
+    if db_slots is None:
+        db_slots = asyncio.Semaphore(DB_MAX_CONCURRENCY)
+    
+    return db_slots
+
+async def execute_query(query: Any, timeout: Optional[float] = None) -> Any:
+    """
+    Execute a supabase query builder without blocking the event loop
+    
+    The blocking `.execute()` call runs on the database executor once a thread is
+    free, so time spent queued behind other queries is not charged to it. If it
+    then runs longer than `timeout` seconds (DB_QUERY_TIMEOUT_SECONDS by default)
+    the caller gets a TimeoutError; the request itself cannot be interrupted, and
+    its thread is only handed to the next query when it finishes.
+    """
+    timeout = timeout if timeout is not None else DB_QUERY_TIMEOUT_SECONDS
+    loop = asyncio.get_running_loop()
+    slots = get_db_slots()
+    
+    await slots.acquire()
+    try:
+        execution = get_db_executor().submit(query.execute)
+    except BaseException:
+        slots.release()
+        raise
+    # Release on the thread's completion, which a timeout or cancellation does not bring forward
+    execution.add_done_callback(lambda _: _release_slot(loop, slots))
+    
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(execution), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Database query timed out after {timeout}s")
+
+def _release_slot(loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore):
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(slots.release)
+
+async def find_missing_ids(table: str, ids: List[str], column: str = "id") -> List[str]:
+    """Return the ids that have no row in `table`, in first-seen order
+    
+    Chunks are queried in waves of at most DB_MAX_CONCURRENCY, so a long id list
+    never queues more queries than the database executor can run at once.
+    """
+    client = get_supabase_client()
+    unique_ids = list(dict.fromkeys(ids))
+    chunks = [
+        unique_ids[start:start + IN_FILTER_CHUNK_SIZE]
+        for start in range(0, len(unique_ids), IN_FILTER_CHUNK_SIZE)
+    ]
+    
+    found = set()
+    for start in range(0, len(chunks), DB_MAX_CONCURRENCY):
+        responses = await gather_all(*(
+            execute_query(
+                client.table(table)
+                    .select(column)
+                    .in_(column, chunk)
+            )
+            for chunk in chunks[start:start + DB_MAX_CONCURRENCY]
+        ))
+        found.update(row[column] for response in responses for row in response.data)
+    return [value for value in unique_ids if value not in found]
+
+async def find_missing_user_ids(user_ids: List[str]) -> List[str]:
+    """Return the user ids that do not exist, resolving them with chunked `in_` queries"""
+    return await find_missing_ids("users", user_ids)
+
 async def init_database():
     """Initialize database tables and connections"""
     try:
         client = get_supabase_client()
         
         # Test connection
-        response = client.table("users").select("count", count="exact").limit(1).execute()
+        response = await execute_query(client.table("users").select("count", count="exact").limit(1))
         logger.info("Database connection successful")
         
         # Initialize tables if they don't exist
@@ -45,6 +140,14 @@ async def create_tables():
     # For now, we'll assume tables exist or create them via SQL
     logger.info("Database tables ready")
 
+def close_database():
+    """Release the database executor, waiting for running queries"""
+    global db_executor, db_slots
+    if db_executor is not None:
+        db_executor.shutdown(wait=True)
+        db_executor = None
+    db_slots = None
+
 def get_database():
     """Dependency to get database client"""
     return get_supabase_client()
@@ -2,11 +2,17 @@ from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import uvicorn
+import asyncio
 import os
 from dotenv import load_dotenv
 
 from app.api import users, payments, trust_scores, lenders, loans
-from app.database.connection import init_database
+from app.database.connection import init_database, close_database
+from app.services.model_registry import get_model_registry
+from app.services.model_training_jobs import get_training_job_manager
+from app.services.rescore_queue import get_rescore_queue
+from app.services.application_rematch import get_application_rematcher
+from app.services.lender_performance import get_lender_performance_tracker
 from app.utils.logger import setup_logger
 
 # Load environment variables
@@ -45,11 +51,40 @@ async def startup_event():
     """Initialize database and services on startup"""
     try:
         await init_database()
+        
+        # Load the trust score model once for all requests, then keep retrying
+        # a failed load and picking up promotions in the background
+        try:
+            await asyncio.to_thread(get_model_registry().load)
+        except Exception as e:
+            logger.error(f"Trust score model not ready: {e}")
+        get_model_registry().start()
+        
+        # Start background rescoring workers
+        get_rescore_queue().start()
+        
+        # Start re-matching open applications after lender changes
+        get_application_rematcher().start()
+        
+        # Reconcile lender performance counters now and periodically
+        get_lender_performance_tracker().start()
+        
         logger.info("Application started successfully")
     except Exception as e:
         logger.error(f"Failed to start application: {e}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background workers on shutdown"""
+    await get_rescore_queue().stop()
+    await get_application_rematcher().stop()
+    await get_lender_performance_tracker().stop()
+    await get_model_registry().stop()
+    get_training_job_manager().shutdown()
+    close_database()
+    logger.info("Application shut down")
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -62,11 +97,17 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
-    return {
-        "status": "healthy",
+    model_status = get_model_registry().status()
+    content = {
+        "status": "healthy" if model_status["ready"] else "degraded",
         "database": "connected",
-        "ml_model": "loaded"
+        "ml_model": "loaded" if model_status["ready"] else "not_loaded",
+        "model": model_status
     }
+    
+    if not model_status["ready"]:
+        return JSONResponse(status_code=503, content=content)
+    return content
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
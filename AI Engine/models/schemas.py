@@ -79,6 +79,7 @@ class TrustScoreBase(BaseModel):
     level: TrustScoreLevel
     factors: Dict[str, Any]
     confidence: float = Field(..., ge=0, le=1)
+    model_version: Optional[str] = None
 
 class TrustScoreCreate(TrustScoreBase):
     user_id: str
@@ -149,11 +150,17 @@ class TrustScoreRequest(BaseModel):
     include_payment_history: bool = True
     include_credit_data: bool = True
 
+class TrustScoreBatchRequest(BaseModel):
+    user_ids: List[str] = Field(..., min_length=1, max_length=50000)
+    include_payment_history: bool = True
+
 class LenderMatchRequest(BaseModel):
     user_id: str
     loan_amount: float
     loan_type: LoanType
     term_months: int
+    limit: Optional[int] = Field(None, ge=1, le=1000)
+    cursor: Optional[str] = None
 
 class LenderMatch(BaseModel):
     lender_id: str
@@ -164,6 +171,19 @@ class LenderMatch(BaseModel):
     requirements_met: bool
     reasons: List[str]
 
+class RateQuoteRequest(BaseModel):
+    loan_amount: float = Field(..., gt=0)
+    term_months: int = Field(..., gt=0, le=360)
+    trust_score: Optional[float] = Field(None, ge=0, le=1000)
+    user_id: Optional[str] = None
+    lender_ids: Optional[List[str]] = Field(None, min_length=1, max_length=10000)
+
+class RateQuote(BaseModel):
+    lender_id: str
+    lender_name: str
+    interest_rate: float
+    eligible: bool
+
 class APIResponse(BaseModel):
     success: bool
     message: str
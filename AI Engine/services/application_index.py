@@ -0,0 +1,391 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, List, Any, Optional, Tuple
+import os
+
+import numpy as np
+
+from app.database.connection import get_supabase_client, execute_query
+from app.services.lender_index import loan_type_key
+
+logger = logging.getLogger(__name__)
+
+LOAD_PAGE_SIZE = 1000
+
+def application_order_key(application: Dict[str, Any]) -> Tuple[str, str]:
+    """Chronological sort key of an application"""
+    return (str(application.get('created_at') or ''), application['id'])
+
+class ApplicationColumns:
+    """
+    Pending applications of one loan type, held as column arrays for range queries
+    
+    Rows are in chronological order. Eligibility for a lender is a trust suffix of
+    the rows sorted by trust_score and an amount prefix of the rows sorted by
+    amount, so it is answered with two binary searches and a scan of the smaller
+    side. Rows are never moved; an application that changes after the build is
+    switched off in `alive` and served from the index delta instead.
+    """
+    
+    def __init__(self, applications: List[Dict[str, Any]]):
+        self.applications = applications
+        self.row_of = {application['id']: row for row, application in enumerate(applications)}
+        self.alive = np.ones(len(applications), dtype=bool)
+        
+        self.trust = np.array([application['trust_score'] for application in applications], dtype=np.float64)
+        self.amount = np.array([application['amount'] for application in applications], dtype=np.float64)
+        
+        self.trust_order = np.argsort(self.trust, kind='stable')
+        self.trust_keys = self.trust[self.trust_order]
+        self.amount_order = np.argsort(self.amount, kind='stable')
+        self.amount_keys = self.amount[self.amount_order]
+    
+    def __len__(self) -> int:
+        return len(self.applications)
+    
+    def retire(self, application_id: str):
+        """Exclude a row that was removed or replaced since the build"""
+        row = self.row_of.get(application_id)
+        if row is not None:
+            self.alive[row] = False
+    
+    def eligible(self, min_trust_score: float, max_loan_amount: float) -> np.ndarray:
+        """Live rows with trust_score >= min_trust_score and amount <= max_loan_amount, in chronological order"""
+        trust_start = int(np.searchsorted(self.trust_keys, min_trust_score, side='left'))
+        amount_end = int(np.searchsorted(self.amount_keys, max_loan_amount, side='right'))
+        
+        # Scan only the smaller side and check the other bound on it
+        if len(self.trust_keys) - trust_start <= amount_end:
+            rows = self.trust_order[trust_start:]
+            rows = rows[self.amount[rows] <= max_loan_amount]
+        else:
+            rows = self.amount_order[:amount_end]
+            rows = rows[self.trust[rows] >= min_trust_score]
+        rows = rows[self.alive[rows]]
+        return np.sort(rows)
+
+class ApplicationIndex:
+    """
+    Process-local index of pending loan applications used for reverse matching
+    
+    Applications are bucketed by loan type and matched to a lender with the same
+    rules as `LenderMatchingService`: the stored trust_score meets the lender's
+    min_trust_score and the amount is within its max_loan_amount. Writes of this
+    worker are applied as a small per-type delta on top of the column arrays,
+    which are rebuilt once the delta exceeds `delta_limit`.
+    
+    Every `refresh_interval` seconds the rows updated since the last sync are read
+    and applied, and the index is rebuilt from scratch only when its size no longer
+    matches the count of indexable rows, e.g. after deletes. Refreshes run in the
+    background while readers keep using the current snapshot; only the first load
+    is waited for. Writes of this worker made during a refresh are journaled and
+    take precedence over the rows it read.
+    """
+    
+    def __init__(self, refresh_interval: Optional[float] = None, delta_limit: Optional[int] = None):
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            float(os.getenv("APPLICATION_INDEX_REFRESH_SECONDS", "30"))
+        self.delta_limit = delta_limit or int(os.getenv("APPLICATION_INDEX_DELTA_LIMIT", "2000"))
+        self._by_type: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._loan_type: Dict[str, str] = {}
+        self._columns: Dict[str, ApplicationColumns] = {}
+        self._delta: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._retired: Dict[str, int] = {}
+        # Latest updated_at already applied; None until a full load has run
+        self._synced_through: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Applications written by this worker while a refresh runs, None once removed
+        self._journal: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+        
+        self.full_loads = 0
+        self.syncs = 0
+    
+    async def ensure_fresh(self):
+        """Load the index on first use and start a background refresh once one is due"""
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        
+        if self._refresh_task is None:
+            self._refresh_task = asyncio.ensure_future(self._refresh())
+            self._refresh_task.add_done_callback(self._refresh_done)
+        if self._checked_at is None:
+            # Nothing to serve until the first load completes
+            await asyncio.shield(self._refresh_task)
+    
+    async def eligible_applications(self, lender: Dict[str, Any], limit: Optional[int] = None,
+                                    offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """Pending applications a lender qualifies for, newest first, and their total count"""
+        await self.ensure_fresh()
+        min_trust_score = lender.get('min_trust_score', 0)
+        max_loan_amount = lender.get('max_loan_amount', 0)
+        wanted = None if limit is None else offset + limit
+        
+        total = 0
+        newest = []
+        for loan_type in {loan_type_key(loan_type) for loan_type in lender.get('loan_types') or []}:
+            columns = self._columns.get(loan_type)
+            if columns is not None:
+                rows = columns.eligible(min_trust_score, max_loan_amount)
+                total += len(rows)
+                # Rows are chronological, so the newest are at the end
+                newest.extend(columns.applications[row] for row in (rows if wanted is None else rows[-wanted:]))
+            
+            delta = [
+                application for application in self._delta.get(loan_type, {}).values()
+                if self._is_eligible(application, min_trust_score, max_loan_amount)
+            ]
+            total += len(delta)
+            newest.extend(delta)
+        
+        if wanted is None:
+            newest.sort(key=application_order_key, reverse=True)
+        else:
+            newest = heapq.nlargest(wanted, newest, key=application_order_key)
+        return newest[offset:], total
+    
+    def candidates(self, lender: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Pending applications within a lender's loan types, trust floor and amount ceiling"""
+        min_trust_score = lender.get('min_trust_score', 0)
+        max_loan_amount = lender.get('max_loan_amount', 0)
+        
+        candidates = []
+        for loan_type in {loan_type_key(loan_type) for loan_type in lender.get('loan_types') or []}:
+            columns = self._columns.get(loan_type)
+            if columns is not None:
+                rows = columns.eligible(min_trust_score, max_loan_amount)
+                candidates.extend(columns.applications[row] for row in rows)
+            candidates.extend(
+                application for application in self._delta.get(loan_type, {}).values()
+                if self._is_eligible(application, min_trust_score, max_loan_amount)
+            )
+        return candidates
+    
+    def get(self, application_id: str) -> Optional[Dict[str, Any]]:
+        loan_type = self._loan_type.get(application_id)
+        if loan_type is None:
+            return None
+        return self._by_type[loan_type].get(application_id)
+    
+    def upsert(self, application: Dict[str, Any]):
+        """Add, replace or drop an application after a write, depending on its status"""
+        if self._journal is not None:
+            self._journal[application['id']] = application
+        self._apply(application['id'], application)
+    
+    def remove(self, application_id: str):
+        """Drop an application that was deleted or left the pending state"""
+        if self._journal is not None:
+            self._journal[application_id] = None
+        self._apply(application_id, None)
+    
+    def invalidate(self):
+        """Force a full reload on next use"""
+        self._checked_at = None
+        self._synced_through = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'applications': len(self._loan_type),
+            'loan_types': {loan_type: len(applications) for loan_type, applications in self._by_type.items()},
+            'delta': sum(len(delta) for delta in self._delta.values()),
+            'retired': sum(self._retired.values()),
+            'synced_through': self._synced_through,
+            'full_loads': self.full_loads,
+            'syncs': self.syncs,
+            'refreshing': self._refresh_task is not None
+        }
+    
+    @staticmethod
+    def _is_indexable(application: Dict[str, Any]) -> bool:
+        # Matching needs a trust score, so applications without one never qualify;
+        # `_indexable_rows` applies the same rule in queries
+        return application.get('status') == 'pending' and bool(application.get('trust_score'))
+    
+    @staticmethod
+    def _indexable_rows(query):
+        """Restrict a loan_applications query to the rows `_is_indexable` accepts"""
+        return query.eq("status", "pending").gt("trust_score", 0)
+    
+    def _apply(self, application_id: str, application: Optional[Dict[str, Any]]):
+        """Replace an application's entry with `application`, or drop it"""
+        loan_type = self._loan_type.pop(application_id, None)
+        if loan_type is not None:
+            self._by_type[loan_type].pop(application_id, None)
+            if self._delta.get(loan_type, {}).pop(application_id, None) is None:
+                columns = self._columns.get(loan_type)
+                if columns is not None:
+                    columns.retire(application_id)
+                self._retired[loan_type] = self._retired.get(loan_type, 0) + 1
+            self._compact(loan_type)
+        
+        if application is None or not self._is_indexable(application):
+            return
+        
+        loan_type = loan_type_key(application['loan_type'])
+        self._by_type.setdefault(loan_type, {})[application_id] = application
+        self._loan_type[application_id] = loan_type
+        self._delta.setdefault(loan_type, {})[application_id] = application
+        self._compact(loan_type)
+    
+    @staticmethod
+    def _is_eligible(application: Dict[str, Any], min_trust_score: float, max_loan_amount: float) -> bool:
+        return min_trust_score <= application['trust_score'] and max_loan_amount >= application['amount']
+    
+    def _compact(self, loan_type: str):
+        """Rebuild a loan type's columns once its delta grows past the limit"""
+        if len(self._delta.get(loan_type, {})) + self._retired.get(loan_type, 0) > self.delta_limit:
+            self._rebuild(loan_type)
+    
+    def _rebuild(self, loan_type: str):
+        applications = sorted(self._by_type.get(loan_type, {}).values(), key=application_order_key)
+        if applications:
+            self._columns[loan_type] = ApplicationColumns(applications)
+        else:
+            self._columns.pop(loan_type, None)
+        self._delta[loan_type] = {}
+        self._retired[loan_type] = 0
+    
+    def _refresh_done(self, task: asyncio.Task):
+        self._refresh_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Error refreshing application index: {task.exception()}")
+    
+    async def _refresh(self):
+        """Apply rows changed since the last sync, or reload everything when counts diverge"""
+        self._journal = {}
+        try:
+            if self._synced_through is not None:
+                await self._sync()
+                if await self._count_indexable() == len(self._loan_type):
+                    self._checked_at = time.monotonic()
+                    return
+                logger.info("Application index out of step with the table; reloading")
+            
+            await self._load()
+            self._checked_at = time.monotonic()
+        finally:
+            self._journal = None
+    
+    async def _count_indexable(self) -> int:
+        supabase = get_supabase_client()
+        response = await execute_query(self._indexable_rows(
+            supabase.table("loan_applications")
+                .select("id", count="exact")
+                .limit(1)
+        ))
+        return response.count or 0
+    
+    async def _latest_update(self) -> Optional[str]:
+        """Latest updated_at of any application, whatever its status"""
+        supabase = get_supabase_client()
+        response = await execute_query(
+            supabase.table("loan_applications")
+                .select("updated_at")
+                .not_.is_("updated_at", "null")
+                .order("updated_at", desc=True)
+                .limit(1)
+        )
+        return response.data[0]['updated_at'] if response.data else None
+    
+    async def _sync(self):
+        """Apply every application updated at or after the sync point, in any status"""
+        supabase = get_supabase_client()
+        changed = []
+        last: Optional[Dict[str, Any]] = None
+        while True:
+            query = (
+                supabase.table("loan_applications")
+                    .select("*")
+                    .order("updated_at")
+                    .order("id")
+                    .limit(LOAD_PAGE_SIZE)
+            )
+            if last is None:
+                query = query.gte("updated_at", self._synced_through)
+            else:
+                query = query.or_(
+                    f'updated_at.gt."{last["updated_at"]}",'
+                    f'and(updated_at.eq."{last["updated_at"]}",id.gt."{last["id"]}")'
+                )
+            response = await execute_query(query)
+            changed.extend(response.data)
+            
+            if len(response.data) < LOAD_PAGE_SIZE:
+                break
+            last = response.data[-1]
+        
+        for application in changed:
+            # This worker's own later writes win over what the sync read
+            if application['id'] not in self._journal:
+                self._apply(application['id'], application)
+        if changed:
+            self._synced_through = changed[-1]['updated_at']
+        self.syncs += 1
+    
+    async def _load(self):
+        """Load every indexable application and rebuild all buckets"""
+        try:
+            # Anything updated after this point is picked up by the next sync
+            synced_through = await self._latest_update()
+            
+            supabase = get_supabase_client()
+            applications = []
+            last: Optional[Dict[str, Any]] = None
+            while True:
+                query = self._indexable_rows(
+                    supabase.table("loan_applications")
+                        .select("*")
+                        .order("created_at")
+                        .order("id")
+                        .limit(LOAD_PAGE_SIZE)
+                )
+                if last is not None:
+                    query = query.or_(
+                        f'created_at.gt."{last["created_at"]}",'
+                        f'and(created_at.eq."{last["created_at"]}",id.gt."{last["id"]}")'
+                    )
+                response = await execute_query(query)
+                applications.extend(response.data)
+                
+                if len(response.data) < LOAD_PAGE_SIZE:
+                    break
+                last = response.data[-1]
+            
+            # Swap in the new snapshot, then reapply writes made while it loaded
+            self._by_type = {}
+            self._loan_type = {}
+            for application in applications:
+                if self._is_indexable(application):
+                    loan_type = loan_type_key(application['loan_type'])
+                    self._by_type.setdefault(loan_type, {})[application['id']] = application
+                    self._loan_type[application['id']] = loan_type
+            
+            self._columns = {}
+            self._delta = {}
+            self._retired = {}
+            for loan_type in self._by_type:
+                self._rebuild(loan_type)
+            for application_id, application in (self._journal or {}).items():
+                self._apply(application_id, application)
+            
+            self._synced_through = synced_through
+            self.full_loads += 1
+            logger.info(f"Application index loaded with {len(self._loan_type)} pending applications")
+        
+        except Exception as e:
+            logger.error(f"Error loading application index: {e}")
+            raise
+
+# Global application index
+application_index: Optional[ApplicationIndex] = None
+
+def get_application_index() -> ApplicationIndex:
+    """Get application index instance"""
+    global application_index
+    if application_index is None:
+        application_index = ApplicationIndex()
+    
+    return application_index
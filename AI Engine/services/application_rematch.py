@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+import os
+
+from app.database.connection import get_supabase_client, execute_query
+from app.services.application_index import get_application_index
+from app.services.lender_index import get_lender_index
+from app.services.lender_matching_service import LenderMatchingService
+from app.utils.concurrency import gather_all
+
+logger = logging.getLogger(__name__)
+
+# Lenders stored on an application, as in apply_for_loan
+MATCHED_LENDERS_LIMIT = 5
+
+class ApplicationRematcher:
+    """
+    Background refresh of `matched_lenders` on open applications after lender writes
+    
+    Only applications a lender change can affect are re-matched: those within the
+    loan types, trust floor and amount ceiling of the lender before or after the
+    change, found with range queries on the application index. Changes arriving
+    within `delay` seconds of each other are handled in one pass, so a burst of
+    lender writes re-matches each application once. Applications are re-matched
+    with their stored trust_score in batches of `batch_size`, and only those whose
+    top matches changed are written back.
+    """
+    
+    def __init__(self, batch_size: Optional[int] = None, delay: Optional[float] = None):
+        self.batch_size = batch_size or int(os.getenv("REMATCH_BATCH_SIZE", "500"))
+        self.delay = delay if delay is not None else float(os.getenv("REMATCH_DELAY_SECONDS", "1.0"))
+        
+        # (lender before, lender after) per write; None on either side for create/delete
+        self._changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        self.lender_changes = 0
+        self.runs = 0
+        self.rematched = 0
+        self.updated = 0
+        self.failed = 0
+        self.last_run_seconds = 0.0
+    
+    def start(self):
+        """Start the background task on the running event loop"""
+        if self._task is not None:
+            return
+        
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info("Application rematcher started")
+    
+    async def stop(self):
+        """Stop the background task; unprocessed changes are dropped"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        
+        if self._changes:
+            logger.warning(f"Application rematcher stopped with {len(self._changes)} lender changes not applied")
+        self._changes = []
+    
+    def lender_changed(self, previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]) -> bool:
+        """Schedule a re-match for a lender write; returns False if the rematcher is not running"""
+        if self._task is None:
+            return False
+        
+        self._changes.append((previous, current))
+        self.lender_changes += 1
+        self._wakeup.set()
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': self._task is not None,
+            'batch_size': self.batch_size,
+            'pending_lender_changes': len(self._changes),
+            'lender_changes': self.lender_changes,
+            'runs': self.runs,
+            'rematched': self.rematched,
+            'updated': self.updated,
+            'failed': self.failed,
+            'last_run_seconds': round(self.last_run_seconds, 3)
+        }
+    
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Let a burst of lender writes settle into one pass
+            await asyncio.sleep(self.delay)
+            self._wakeup.clear()
+            changes, self._changes = self._changes, []
+            
+            started = time.monotonic()
+            try:
+                await self.rematch(changes)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Re-matching applications after {len(changes)} lender changes failed: {e}")
+            self.runs += 1
+            self.last_run_seconds = time.monotonic() - started
+    
+    async def rematch(self, changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]):
+        """Re-match the open applications affected by a set of lender changes"""
+        application_index = get_application_index()
+        await gather_all(application_index.ensure_fresh(), get_lender_index().ensure_fresh())
+        
+        affected = set()
+        for previous, current in changes:
+            for lender in (previous, current):
+                if lender is not None:
+                    affected.update(application['id'] for application in application_index.candidates(lender))
+        
+        application_ids = sorted(affected)
+        for start in range(0, len(application_ids), self.batch_size):
+            await self._rematch_batch(application_ids[start:start + self.batch_size])
+        logger.info(f"Re-matched {len(application_ids)} applications after {len(changes)} lender changes")
+    
+    async def _rematch_batch(self, application_ids: List[str]):
+        lender_service = LenderMatchingService()
+        application_index = get_application_index()
+        
+        updates = []
+        for application_id in application_ids:
+            # Skip applications that left the pending state since they were collected
+            application = application_index.get(application_id)
+            if application is None:
+                continue
+            
+            page = await lender_service.find_matching_lenders_for_score(
+                application['trust_score'],
+                application['amount'],
+                application['loan_type'],
+                application['term_months'],
+                limit=MATCHED_LENDERS_LIMIT
+            )
+            self.rematched += 1
+            matched_lenders = [match.lender_id for match in page['matches']]
+            if matched_lenders != (application.get('matched_lenders') or []):
+                updates.append((application_id, matched_lenders))
+        
+        await asyncio.gather(*(self._update(application_id, matched_lenders)
+                               for application_id, matched_lenders in updates))
+    
+    async def _update(self, application_id: str, matched_lenders: List[str]):
+        try:
+            supabase = get_supabase_client()
+            response = await execute_query(
+                supabase.table("loan_applications")
+                    .update({
+                        "matched_lenders": matched_lenders,
+                        "updated_at": datetime.now().isoformat()
+                    })
+                    .eq("id", application_id)
+                    .eq("status", "pending")
+            )
+            
+            for application in response.data:
+                get_application_index().upsert(application)
+            self.updated += len(response.data)
+        
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error updating matched lenders of application {application_id}: {e}")
+
+# Global application rematcher
+application_rematcher: Optional[ApplicationRematcher] = None
+
+def get_application_rematcher() -> ApplicationRematcher:
+    """Get application rematcher instance"""
+    global application_rematcher
+    if application_rematcher is None:
+        application_rematcher = ApplicationRematcher()
+    
+    return application_rematcher
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Any, Optional, Tuple
+import os
+
+import numpy as np
+
+from app.database.connection import get_supabase_client, execute_query
+from app.services.lender_scoring import LenderColumns, rate_sheets, rate_range
+
+logger = logging.getLogger(__name__)
+
+LOAD_PAGE_SIZE = 1000
+
+def loan_type_key(loan_type: Any) -> str:
+    """Normalise a LoanType or its string value to the string used as index key"""
+    return getattr(loan_type, 'value', loan_type)
+
+class LenderIndex:
+    """
+    Process-local lender index used for matching
+    
+    The lenders table is loaded once and kept current by the lender write paths of
+    this worker. Every `refresh_interval` seconds the row count and latest
+    `updated_at` are compared with the loaded snapshot, and the index reloads when
+    another worker changed the table. `version` increases on every change so
+    derived results can be keyed on it. Each lender's rate sheet, its interest
+    rate for every trust, amount and term band, is computed when the lender is
+    loaded or written, so quotes are a single lookup. Each lender keeps the load
+    sequence it was first given for the life of the index, including across
+    reloads, so match cursors stay valid.
+    """
+    
+    def __init__(self, refresh_interval: Optional[float] = None):
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            float(os.getenv("LENDER_INDEX_REFRESH_SECONDS", "30"))
+        self.version = 0
+        self._lenders: Dict[str, Dict[str, Any]] = {}
+        self._sequence: Dict[str, int] = {}
+        self._next_sequence = 0
+        self._columns: Dict[str, LenderColumns] = {}
+        self._rate_sheets: Dict[str, np.ndarray] = {}
+        self._source_version: Optional[Tuple[int, Optional[str]]] = None
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+    
+    async def ensure_fresh(self):
+        """Load the index on first use and reload it if the table changed elsewhere"""
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+            return
+        
+        async with self._lock:
+            if self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            
+            source_version = await self._read_source_version()
+            if source_version != self._source_version:
+                await self._load()
+                self._source_version = source_version
+            self._checked_at = time.monotonic()
+    
+    async def columns(self, loan_type: Any) -> Optional[LenderColumns]:
+        """Column arrays of the lenders offering a loan type"""
+        await self.ensure_fresh()
+        return self._columns.get(loan_type_key(loan_type))
+    
+    async def candidates(self, loan_type: Any, trust_score: float, loan_amount: float) -> List[Dict[str, Any]]:
+        """Eligible lenders for a request, in load order"""
+        columns = await self.columns(loan_type)
+        if columns is None:
+            return []
+        return [columns.lenders[row] for row in columns.eligible(trust_score, loan_amount)]
+    
+    def get(self, lender_id: str) -> Optional[Dict[str, Any]]:
+        return self._lenders.get(lender_id)
+    
+    def lenders(self) -> List[Dict[str, Any]]:
+        """All lenders, in load order"""
+        return sorted(self._lenders.values(), key=lambda lender: self._sequence[lender['id']])
+    
+    def rate_sheet(self, lender_id: str) -> Optional[np.ndarray]:
+        """Interest rates of a lender indexed by trust, amount and term band"""
+        return self._rate_sheets.get(lender_id)
+    
+    def upsert(self, lender: Dict[str, Any]):
+        """Add or replace a lender after a write"""
+        previous = self._lenders.get(lender['id'])
+        if lender['id'] not in self._sequence:
+            self._sequence[lender['id']] = self._next_sequence
+            self._next_sequence += 1
+        self._lenders[lender['id']] = lender
+        self._rate_sheets.update(self._build_rate_sheets([lender]))
+        
+        affected = set(self._loan_types(lender))
+        if previous is not None:
+            affected.update(self._loan_types(previous))
+        self._rebuild(affected)
+        
+        # Keep the snapshot in step so our own writes don't trigger a reload
+        if self._source_version is not None:
+            count, latest = self._source_version
+            updated_at = lender.get('updated_at')
+            if updated_at and (latest is None or updated_at > latest):
+                latest = updated_at
+            self._source_version = (count + (1 if previous is None else 0), latest)
+    
+    def remove(self, lender_id: str):
+        """Drop a deleted lender"""
+        previous = self._lenders.pop(lender_id, None)
+        self._sequence.pop(lender_id, None)
+        self._rate_sheets.pop(lender_id, None)
+        if previous is not None:
+            self._rebuild(set(self._loan_types(previous)))
+            if self._source_version is not None:
+                count, latest = self._source_version
+                self._source_version = (count - 1, latest)
+    
+    def invalidate(self):
+        """Force a reload on next use"""
+        self._checked_at = None
+        self._source_version = None
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'lenders': len(self._lenders),
+            'loan_types': {loan_type: len(columns) for loan_type, columns in self._columns.items()}
+        }
+    
+    @staticmethod
+    def _loan_types(lender: Dict[str, Any]) -> List[str]:
+        return [loan_type_key(loan_type) for loan_type in lender.get('loan_types') or []]
+    
+    @staticmethod
+    def _build_rate_sheets(lenders: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        ranges = np.array([rate_range(lender) for lender in lenders], dtype=np.float64).reshape(-1, 2)
+        sheets = rate_sheets(ranges[:, 0], ranges[:, 1])
+        return {lender['id']: sheet for lender, sheet in zip(lenders, sheets)}
+    
+    def _rebuild(self, loan_types: set):
+        for loan_type in loan_types:
+            lenders = [lender for lender in self._lenders.values() if loan_type in self._loan_types(lender)]
+            if lenders:
+                lenders.sort(key=lambda lender: self._sequence[lender['id']])
+                self._columns[loan_type] = LenderColumns(
+                    lenders, loan_type, [self._sequence[lender['id']] for lender in lenders]
+                )
+            else:
+                self._columns.pop(loan_type, None)
+        self.version += 1
+    
+    async def _read_source_version(self) -> Tuple[int, Optional[str]]:
+        """Row count and latest update time of the lenders table"""
+        supabase = get_supabase_client()
+        response = await execute_query(
+            supabase.table("lenders")
+                .select("updated_at", count="exact")
+                .order("updated_at", desc=True)
+                .limit(1)
+        )
+        latest = response.data[0]['updated_at'] if response.data else None
+        return (response.count or 0, latest)
+    
+    async def _load(self):
+        """Load every lender and rebuild all buckets"""
+        try:
+            supabase = get_supabase_client()
+            lenders = []
+            offset = 0
+            while True:
+                response = await execute_query(
+                    supabase.table("lenders")
+                        .select("*")
+                        .order("created_at")
+                        .order("id")
+                        .range(offset, offset + LOAD_PAGE_SIZE - 1)
+                )
+                lenders.extend(response.data)
+                
+                if len(response.data) < LOAD_PAGE_SIZE:
+                    break
+                offset += LOAD_PAGE_SIZE
+            
+            self._lenders = {lender['id']: lender for lender in lenders}
+            # Keep the sequence of lenders already known so match cursors stay valid
+            # across reloads; only lenders new to this worker get the next ones
+            sequence = {}
+            for lender in lenders:
+                if lender['id'] in self._sequence:
+                    sequence[lender['id']] = self._sequence[lender['id']]
+                else:
+                    sequence[lender['id']] = self._next_sequence
+                    self._next_sequence += 1
+            self._sequence = sequence
+            self._rate_sheets = self._build_rate_sheets(lenders)
+            self._columns = {}
+            self._rebuild({loan_type for lender in lenders for loan_type in self._loan_types(lender)})
+            logger.info(f"Lender index loaded with {len(lenders)} lenders")
+        
+        except Exception as e:
+            logger.error(f"Error loading lender index: {e}")
+            raise
+
+# Global lender index
+lender_index: Optional[LenderIndex] = None
+
+def get_lender_index() -> LenderIndex:
+    """Get lender index instance"""
+    global lender_index
+    if lender_index is None:
+        lender_index = LenderIndex()
+    
+    return lender_index
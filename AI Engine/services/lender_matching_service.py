@@ -1,10 +1,17 @@
 import logging
 from typing import Dict, List, Any, Optional
-from datetime import datetime
 import math
+import os
 
-from app.database.connection import get_supabase_client
-from app.models.schemas import LenderMatch, LenderMatchRequest, Lender, LoanType
+from app.database.connection import get_supabase_client, execute_query
+from app.models.schemas import LenderMatch, LenderMatchRequest, Lender, LoanType, RateQuote
+from app.services.lender_index import get_lender_index, loan_type_key
+from app.services.lender_performance import get_lender_performance_tracker
+from app.services.lender_scoring import (
+    select_matches, encode_cursor, decode_cursor, term_weight, term_rate_multiplier, rate_band
+)
+from app.utils.cache import TTLCache
+from app.utils.concurrency import gather_all
 
 logger = logging.getLogger(__name__)
 
@@ -13,68 +20,164 @@ class LenderMatchingService:
     
     def __init__(self):
         self.supabase = get_supabase_client()
+        self.lender_index = get_lender_index()
+        self.match_cache = get_match_cache()
     
     async def find_matching_lenders(self, user_id: str, loan_amount: float, 
-                                  loan_type: LoanType, term_months: int) -> List[LenderMatch]:
-        """Find matching lenders for a user's loan request"""
+                                  loan_type: LoanType, term_months: int,
+                                  limit: Optional[int] = None) -> List[LenderMatch]:
+        """Find matching lenders for a user's loan request, best first"""
+        page = await self.find_matching_lenders_page(user_id, loan_amount, loan_type, term_months, limit=limit)
+        return page['matches']
+    
+    async def find_matching_lenders_page(self, user_id: str, loan_amount: float,
+                                         loan_type: LoanType, term_months: int,
+                                         limit: Optional[int] = None,
+                                         cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Find one page of matching lenders
+        
+        Only the `limit` best matches after `cursor` are ranked and materialized;
+        `next_cursor` continues from the last of them while more remain. Pages are
+        memoized by lender index version and banded borrower profile, since every
+        request in the same bands gets the same matches.
+        """
         try:
-            # Get user's trust score
-            trust_score = await self._get_user_trust_score(user_id)
+            # Get user's trust score while making sure the lender index is current
+            trust_score, _ = await gather_all(
+                self._get_user_trust_score(user_id),
+                self.lender_index.ensure_fresh()
+            )
             if not trust_score:
                 raise ValueError(f"No trust score found for user {user_id}")
             
-            # Get all lenders
-            lenders = await self._get_all_lenders()
+            return await self.find_matching_lenders_for_score(
+                trust_score, loan_amount, loan_type, term_months, limit=limit, cursor=cursor
+            )
             
-            # Filter and score lenders
-            matches = []
-            for lender in lenders:
-                match_score = self._calculate_match_score(
-                    lender, trust_score, loan_amount, loan_type, term_months
+        except Exception as e:
+            logger.error(f"Error finding matching lenders for user {user_id}: {e}")
+            raise
+    
+    async def find_matching_lenders_for_score(self, trust_score: float, loan_amount: float,
+                                              loan_type: LoanType, term_months: int,
+                                              limit: Optional[int] = None,
+                                              cursor: Optional[str] = None) -> Dict[str, Any]:
+        """One page of matching lenders for a known trust score, e.g. one stored on an application"""
+        after = decode_cursor(cursor) if cursor else None
+        
+        # Score the lenders whose trust floor, amount ceiling and loan types fit
+        # in one vectorized pass
+        columns = await self.lender_index.columns(loan_type)
+        if columns is None:
+            return {'matches': [], 'total_matches': 0, 'next_cursor': None}
+        
+        trust_class, amount_class = columns.profile_class(trust_score, loan_amount)
+        cache_key = (
+            self.lender_index.version, loan_type_key(loan_type), trust_class, amount_class,
+            term_weight(term_months), term_rate_multiplier(term_months), limit, after
+        )
+        page = self.match_cache.get(cache_key)
+        if page is not None:
+            return {**page, 'matches': list(page['matches'])}
+        
+        rows = columns.eligible(trust_score, loan_amount)
+        match_scores, interest_rates, requirements_met = columns.score(
+            rows, trust_score, loan_amount, term_months
+        )
+        
+        # Only include lenders with positive match score
+        positive = match_scores > 0
+        rows = rows[positive]
+        match_scores = match_scores[positive]
+        interest_rates = interest_rates[positive]
+        requirements_met = requirements_met[positive]
+        sequence = columns.sequence[rows]
+        
+        # Rank and materialize only this page, plus one to know if more remain
+        selected = select_matches(match_scores, sequence, None if limit is None else limit + 1, after)
+        has_more = limit is not None and len(selected) > limit
+        selected = selected[:limit] if has_more else selected
+        
+        matches = [
+            self._build_match(
+                columns.lenders[rows[i]], float(match_scores[i]), float(interest_rates[i]),
+                bool(requirements_met[i]), trust_score, loan_amount, loan_type
+            )
+            for i in selected
+        ]
+        
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_cursor(matches[-1].match_score, int(sequence[selected[-1]]))
+        
+        page = {
+            'matches': matches,
+            'total_matches': len(rows),
+            'next_cursor': next_cursor
+        }
+        self.match_cache.set(cache_key, page)
+        return {**page, 'matches': list(matches)}
+    
+    async def get_rate_quotes(self, loan_amount: float, term_months: int,
+                              trust_score: Optional[float] = None, user_id: Optional[str] = None,
+                              lender_ids: Optional[List[str]] = None) -> List[RateQuote]:
+        """
+        Interest rate quotes from precomputed rate sheets, without running the matcher
+        
+        Quotes are for a given trust score or the user's current one, from the given
+        lenders or all of them; unknown lender ids are skipped.
+        """
+        try:
+            if trust_score is None:
+                if not user_id:
+                    raise ValueError("Either trust_score or user_id is required")
+                trust_score, _ = await gather_all(
+                    self._get_user_trust_score(user_id),
+                    self.lender_index.ensure_fresh()
                 )
-                
-                if match_score > 0:  # Only include lenders with positive match score
-                    interest_rate = self._calculate_interest_rate(
-                        lender, trust_score, loan_amount, term_months
-                    )
-                    
-                    requirements_met = self._check_requirements(
-                        lender, trust_score, loan_amount, loan_type
-                    )
-                    
-                    reasons = self._get_match_reasons(
-                        lender, trust_score, loan_amount, loan_type, match_score
-                    )
-                    
-                    match = LenderMatch(
-                        lender_id=lender['id'],
-                        lender_name=lender['name'],
-                        match_score=round(match_score, 3),
-                        interest_rate=round(interest_rate, 2),
-                        max_amount=lender['max_loan_amount'],
-                        requirements_met=requirements_met,
-                        reasons=reasons
-                    )
-                    
-                    matches.append(match)
+                if not trust_score:
+                    raise ValueError(f"No trust score found for user {user_id}")
+            else:
+                await self.lender_index.ensure_fresh()
             
-            # Sort by match score (highest first)
-            matches.sort(key=lambda x: x.match_score, reverse=True)
+            if lender_ids is None:
+                lenders = self.lender_index.lenders()
+            else:
+                lenders = [lender for lender in map(self.lender_index.get, lender_ids) if lender]
             
-            return matches
+            band = rate_band(trust_score, loan_amount, term_months)
+            return [
+                RateQuote(
+                    lender_id=lender['id'],
+                    lender_name=lender['name'],
+                    interest_rate=round(float(self.lender_index.rate_sheet(lender['id'])[band]), 2),
+                    eligible=(lender.get('min_trust_score', 0) <= trust_score and
+                              lender.get('max_loan_amount', 0) >= loan_amount)
+                )
+                for lender in lenders
+            ]
             
         except Exception as e:
-            logger.error(f"Error finding matching lenders for user {user_id}: {e}")
+            logger.error(f"Error getting rate quotes: {e}")
             raise
     
+    def get_metrics(self) -> Dict[str, Any]:
+        """Match cache and lender index metrics"""
+        return {
+            'cache': self.match_cache.stats(),
+            'index': self.lender_index.stats()
+        }
+    
     async def get_lender_details(self, lender_id: str) -> Optional[Dict[str, Any]]:
         """Get detailed information about a specific lender"""
         try:
-            response = self.supabase.table("lenders") \
-                .select("*") \
-                .eq("id", lender_id) \
-                .single() \
-                .execute()
+            response = await execute_query(
+                self.supabase.table("lenders")
+                    .select("*")
+                    .eq("id", lender_id)
+                    .single()
+            )
             
             if response.data:
                 return response.data
@@ -85,168 +188,27 @@ class LenderMatchingService:
             raise
     
     async def get_lender_performance(self, lender_id: str) -> Dict[str, Any]:
-        """Get performance metrics for a lender"""
+        """Get performance metrics for a lender from the incrementally maintained counters"""
         try:
-            # This would typically aggregate data from loan applications
-            # For now, return basic metrics
-            return {
-                'lender_id': lender_id,
-                'total_loans_processed': 0,
-                'average_approval_rate': 0.85,
-                'average_processing_time_days': 3.5,
-                'customer_satisfaction_score': 4.2,
-                'last_updated': datetime.now().isoformat()
-            }
+            return get_lender_performance_tracker().performance(lender_id)
             
         except Exception as e:
             logger.error(f"Error getting lender performance for {lender_id}: {e}")
             raise
     
-    def _calculate_match_score(self, lender: Dict, trust_score: float, 
-                             loan_amount: float, loan_type: LoanType, 
-                             term_months: int) -> float:
-        """Calculate how well a lender matches the user's requirements"""
-        score = 0.0
-        
-        # Trust score compatibility (40% weight)
-        trust_score_weight = self._calculate_trust_score_weight(lender, trust_score)
-        score += trust_score_weight * 0.4
-        
-        # Loan amount compatibility (25% weight)
-        amount_weight = self._calculate_amount_weight(lender, loan_amount)
-        score += amount_weight * 0.25
-        
-        # Loan type compatibility (20% weight)
-        type_weight = self._calculate_type_weight(lender, loan_type)
-        score += type_weight * 0.2
-        
-        # Term compatibility (15% weight)
-        term_weight = self._calculate_term_weight(lender, term_months)
-        score += term_weight * 0.15
-        
-        return score
-    
-    def _calculate_trust_score_weight(self, lender: Dict, trust_score: float) -> float:
-        """Calculate weight based on trust score compatibility"""
-        min_trust = lender.get('min_trust_score', 0)
-        
-        if trust_score < min_trust:
-            return 0.0
-        
-        # Higher trust scores get better weights
-        if trust_score >= 800:
-            return 1.0
-        elif trust_score >= 650:
-            return 0.9
-        elif trust_score >= 500:
-            return 0.7
-        elif trust_score >= 300:
-            return 0.5
-        else:
-            return 0.3
-    
-    def _calculate_amount_weight(self, lender: Dict, loan_amount: float) -> float:
-        """Calculate weight based on loan amount compatibility"""
-        max_amount = lender.get('max_loan_amount', 0)
-        
-        if loan_amount > max_amount:
-            return 0.0
-        
-        # Prefer lenders that can handle the full amount
-        utilization = loan_amount / max_amount
-        
-        if utilization <= 0.5:
-            return 1.0  # Excellent fit
-        elif utilization <= 0.8:
-            return 0.8  # Good fit
-        else:
-            return 0.6  # Acceptable fit
-    
-    def _calculate_type_weight(self, lender: Dict, loan_type: LoanType) -> float:
-        """Calculate weight based on loan type compatibility"""
-        supported_types = lender.get('loan_types', [])
-        
-        if loan_type in supported_types:
-            return 1.0
-        else:
-            return 0.0
-    
-    def _calculate_term_weight(self, lender: Dict, term_months: int) -> float:
-        """Calculate weight based on loan term compatibility"""
-        # Most lenders support standard terms (12-60 months)
-        if 12 <= term_months <= 60:
-            return 1.0
-        elif 6 <= term_months <= 84:
-            return 0.8
-        else:
-            return 0.5
-    
-    def _calculate_interest_rate(self, lender: Dict, trust_score: float, 
-                               loan_amount: float, term_months: int) -> float:
-        """Calculate interest rate based on lender's range and user's profile"""
-        rate_range = lender.get('interest_rate_range', {})
-        min_rate = rate_range.get('min', 5.0)
-        max_rate = rate_range.get('max', 25.0)
-        
-        # Base rate on trust score
-        if trust_score >= 800:
-            rate_multiplier = 0.8  # Excellent borrowers get better rates
-        elif trust_score >= 650:
-            rate_multiplier = 0.9
-        elif trust_score >= 500:
-            rate_multiplier = 1.0
-        elif trust_score >= 300:
-            rate_multiplier = 1.1
-        else:
-            rate_multiplier = 1.2  # Higher risk borrowers pay more
-        
-        # Adjust for loan amount (larger loans often get better rates)
-        if loan_amount >= 50000:
-            amount_multiplier = 0.95
-        elif loan_amount >= 25000:
-            amount_multiplier = 0.98
-        else:
-            amount_multiplier = 1.0
-        
-        # Adjust for term length (longer terms often have higher rates)
-        if term_months <= 12:
-            term_multiplier = 0.95
-        elif term_months <= 36:
-            term_multiplier = 1.0
-        else:
-            term_multiplier = 1.05
-        
-        # Calculate final rate
-        base_rate = (min_rate + max_rate) / 2
-        final_rate = base_rate * rate_multiplier * amount_multiplier * term_multiplier
-        
-        # Ensure rate is within lender's range
-        return max(min_rate, min(max_rate, final_rate))
-    
-    def _check_requirements(self, lender: Dict, trust_score: float, 
-                          loan_amount: float, loan_type: LoanType) -> bool:
-        """Check if user meets lender's requirements"""
-        requirements = lender.get('requirements', {})
-        
-        # Check trust score requirement
-        min_trust = requirements.get('min_trust_score', 0)
-        if trust_score < min_trust:
-            return False
-        
-        # Check income requirement
-        min_income = requirements.get('min_income', 0)
-        # This would need user income data
-        
-        # Check employment requirement
-        employment_required = requirements.get('employment_required', False)
-        # This would need user employment data
-        
-        # Check loan type requirement
-        supported_types = requirements.get('supported_loan_types', [])
-        if supported_types and loan_type not in supported_types:
-            return False
-        
-        return True
+    def _build_match(self, lender: Dict, match_score: float, interest_rate: float,
+                     requirements_met: bool, trust_score: float, loan_amount: float,
+                     loan_type: LoanType) -> LenderMatch:
+        """Materialize a scored lender as a match, with its reasons"""
+        return LenderMatch(
+            lender_id=lender['id'],
+            lender_name=lender['name'],
+            match_score=round(match_score, 3),
+            interest_rate=round(interest_rate, 2),
+            max_amount=lender['max_loan_amount'],
+            requirements_met=requirements_met,
+            reasons=self._get_match_reasons(lender, trust_score, loan_amount, loan_type, match_score)
+        )
     
     def _get_match_reasons(self, lender: Dict, trust_score: float, 
                           loan_amount: float, loan_type: LoanType, 
@@ -291,11 +253,12 @@ class LenderMatchingService:
     async def _get_user_trust_score(self, user_id: str) -> Optional[float]:
         """Get user's current trust score"""
         try:
-            response = self.supabase.table("users") \
-                .select("trust_score") \
-                .eq("id", user_id) \
-                .single() \
-                .execute()
+            response = await execute_query(
+                self.supabase.table("users")
+                    .select("trust_score")
+                    .eq("id", user_id)
+                    .single()
+            )
             
             if response.data and response.data.get('trust_score'):
                 return response.data['trust_score']
@@ -305,19 +268,6 @@ class LenderMatchingService:
             logger.error(f"Error getting trust score for user {user_id}: {e}")
             raise
     
-    async def _get_all_lenders(self) -> List[Dict[str, Any]]:
-        """Get all available lenders"""
-        try:
-            response = self.supabase.table("lenders") \
-                .select("*") \
-                .execute()
-            
-            return response.data
-            
-        except Exception as e:
-            logger.error(f"Error getting lenders: {e}")
-            raise
-    
     async def create_sample_lenders(self):
         """Create sample lenders for testing"""
         sample_lenders = [
@@ -390,12 +340,28 @@ class LenderMatchingService:
         
         try:
             for lender_data in sample_lenders:
-                self.supabase.table("lenders") \
-                    .insert(lender_data) \
-                    .execute()
+                await execute_query(
+                    self.supabase.table("lenders")
+                        .insert(lender_data)
+                )
             
+            self.lender_index.invalidate()
             logger.info("Sample lenders created successfully")
             
         except Exception as e:
             logger.error(f"Error creating sample lenders: {e}")
             raise
+
+# Global match page cache
+match_cache: Optional[TTLCache] = None
+
+def get_match_cache() -> TTLCache:
+    """Get match page cache instance"""
+    global match_cache
+    if match_cache is None:
+        match_cache = TTLCache(
+            maxsize=int(os.getenv("LENDER_MATCH_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("LENDER_MATCH_CACHE_TTL_SECONDS", "600"))
+        )
+    
+    return match_cache
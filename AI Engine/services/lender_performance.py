@@ -0,0 +1,233 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+import os
+
+from app.database.connection import get_supabase_client, execute_query
+
+logger = logging.getLogger(__name__)
+
+LOAD_PAGE_SIZE = 1000
+
+# Application statuses that count as a lender decision
+APPROVED_STATUSES = ("approved",)
+REJECTED_STATUSES = ("rejected", "declined")
+
+COUNTER_FIELDS = ("approved", "rejected", "processing_seconds", "timed")
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+def _seconds_between(start: Any, end: Any) -> Optional[float]:
+    start, end = _parse_timestamp(start), _parse_timestamp(end)
+    if start is None or end is None:
+        return None
+    # Rows written by this service carry naive timestamps
+    if (start.tzinfo is None) != (end.tzinfo is None):
+        start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)
+    return max((end - start).total_seconds(), 0.0)
+
+def decision_of(application: Optional[Dict[str, Any]]) -> Optional[Tuple[str, bool, Optional[float]]]:
+    """(lender id, approved, processing seconds) of a decided application, None otherwise"""
+    if not application:
+        return None
+    status = application.get('status')
+    matched_lenders = application.get('matched_lenders') or []
+    if status not in APPROVED_STATUSES + REJECTED_STATUSES or not matched_lenders:
+        return None
+    # The deciding lender is kept first in matched_lenders
+    return (
+        matched_lenders[0],
+        status in APPROVED_STATUSES,
+        _seconds_between(application.get('created_at'), application.get('updated_at'))
+    )
+
+def is_same_decision(previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]) -> bool:
+    """Whether both states are decided by the same lender with the same outcome"""
+    before, after = decision_of(previous), decision_of(current)
+    return before is not None and after is not None and before[:2] == after[:2]
+
+class LenderPerformanceTracker:
+    """
+    Per-lender performance counters served in O(1)
+    
+    Decisions are attributed to the first lender in an application's
+    matched_lenders, which the status endpoint sets to the deciding lender.
+    Applications decided outside that endpoint are only credited correctly if
+    the writer keeps the same convention. Counters of decided applications are
+    adjusted on every status change made through this worker, and a full
+    reconciliation from `loan_applications` replaces them every
+    `reconcile_interval` seconds to pick up writes from other workers.
+    
+    Loan outcomes are not tracked: `loans.lender_id` references
+    `profiles(user_id)` rather than `lenders.id`, and no column maps one to the
+    other, so funded and defaulted loans cannot be credited to a lender. Those
+    metrics are reported as unavailable (None). Transitions recorded while
+    it loads are journaled by application and applied to the new counters before
+    they are swapped in. A re-sent decision keeps the first decision's processing
+    time.
+    """
+    
+    def __init__(self, reconcile_interval: Optional[float] = None):
+        self.reconcile_interval = reconcile_interval if reconcile_interval is not None else \
+            float(os.getenv("LENDER_PERFORMANCE_RECONCILE_SECONDS", "300"))
+        self._counters: Dict[str, Dict[str, float]] = defaultdict(self._empty_counters)
+        self._task: Optional[asyncio.Task] = None
+        # Latest state per application changed while a reconciliation loads, None once deleted
+        self._journal: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+        
+        self.reconciled_at: Optional[datetime] = None
+        self.reconciliations = 0
+        self.failed_reconciliations = 0
+    
+    def start(self):
+        """Start periodic reconciliation on the running event loop, beginning now"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    def record_transition(self, previous: Optional[Dict[str, Any]], current: Optional[Dict[str, Any]]):
+        """Move an application's decision from its previous state to its current one"""
+        if is_same_decision(previous, current):
+            # A re-sent decision keeps the first decision's processing time
+            return
+        
+        self._apply(decision_of(previous), -1)
+        self._apply(decision_of(current), 1)
+        if self._journal is not None:
+            self._journal[(current or previous)['id']] = current
+    
+    def performance(self, lender_id: str) -> Dict[str, Any]:
+        counters = self._counters.get(lender_id) or self._empty_counters()
+        processed = int(counters['approved'] + counters['rejected'])
+        return {
+            'lender_id': lender_id,
+            'total_loans_processed': processed,
+            'approved': int(counters['approved']),
+            'rejected': int(counters['rejected']),
+            'average_approval_rate': round(counters['approved'] / processed, 4) if processed else None,
+            'average_processing_time_days': round(counters['processing_seconds'] / counters['timed'] / 86400, 2)
+            if counters['timed'] else None,
+            # Loans cannot be attributed to lenders, see the class docstring
+            'loans_funded': None,
+            'loans_defaulted': None,
+            'default_rate': None,
+            'last_updated': datetime.now().isoformat(),
+            'last_reconciled': self.reconciled_at.isoformat() if self.reconciled_at else None
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'lenders': len(self._counters),
+            'reconcile_interval_seconds': self.reconcile_interval,
+            'reconciliations': self.reconciliations,
+            'failed_reconciliations': self.failed_reconciliations,
+            'last_reconciled': self.reconciled_at.isoformat() if self.reconciled_at else None
+        }
+    
+    async def reconcile(self):
+        """Recompute every lender's counters from the database and swap them in"""
+        self._journal = {}
+        try:
+            applications = await self._load_rows(
+                "loan_applications", "id, status, matched_lenders, created_at, updated_at",
+                APPROVED_STATUSES + REJECTED_STATUSES
+            )
+            
+            counters: Dict[str, Dict[str, float]] = defaultdict(self._empty_counters)
+            for application in applications:
+                decision = decision_of(application)
+                if decision is not None:
+                    self._add(counters, decision, 1)
+            
+            # Count each application changed meanwhile as its latest state, whether
+            # the load read it before or after the change
+            if self._journal:
+                loaded = {application['id']: application for application in applications}
+                for application_id, current in self._journal.items():
+                    for decision, sign in ((decision_of(loaded.get(application_id)), -1), (decision_of(current), 1)):
+                        if decision is not None:
+                            self._add(counters, decision, sign)
+            
+            self._counters = counters
+        finally:
+            self._journal = None
+        
+        self.reconciled_at = datetime.now()
+        self.reconciliations += 1
+        logger.info(f"Lender performance reconciled for {len(counters)} lenders")
+    
+    @staticmethod
+    def _empty_counters() -> Dict[str, float]:
+        return dict.fromkeys(COUNTER_FIELDS, 0)
+    
+    def _apply(self, decision: Optional[Tuple[str, bool, Optional[float]]], sign: int):
+        if decision is not None:
+            self._add(self._counters, decision, sign)
+    
+    @staticmethod
+    def _add(counters: Dict[str, Dict[str, float]], decision: Tuple[str, bool, Optional[float]], sign: int):
+        lender_id, approved, processing_seconds = decision
+        lender_counters = counters[lender_id]
+        lender_counters['approved' if approved else 'rejected'] += sign
+        if processing_seconds is not None:
+            lender_counters['processing_seconds'] += sign * processing_seconds
+            lender_counters['timed'] += sign
+    
+    async def _load_rows(self, table: str, columns: str,
+                         statuses: Optional[Tuple[str, ...]] = None) -> List[Dict[str, Any]]:
+        """All rows of a table, optionally limited to some statuses, keyset-paged by id"""
+        supabase = get_supabase_client()
+        rows = []
+        while True:
+            query = (
+                supabase.table(table)
+                    .select(columns)
+                    .order("id")
+                    .limit(LOAD_PAGE_SIZE)
+            )
+            if statuses:
+                query = query.in_("status", list(statuses))
+            if rows:
+                query = query.gt("id", rows[-1]['id'])
+            response = await execute_query(query)
+            rows.extend(response.data)
+            
+            if len(response.data) < LOAD_PAGE_SIZE:
+                return rows
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed_reconciliations += 1
+                logger.error(f"Lender performance reconciliation failed: {e}")
+            await asyncio.sleep(self.reconcile_interval)
+
+# Global lender performance tracker
+lender_performance_tracker: Optional[LenderPerformanceTracker] = None
+
+def get_lender_performance_tracker() -> LenderPerformanceTracker:
+    """Get lender performance tracker instance"""
+    global lender_performance_tracker
+    if lender_performance_tracker is None:
+        lender_performance_tracker = LenderPerformanceTracker()
+    
+    return lender_performance_tracker
@@ -0,0 +1,271 @@
+import base64
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+def trust_weight(trust_score: float) -> float:
+    """Match weight of a borrower's trust score band"""
+    if trust_score >= 800:
+        return 1.0
+    elif trust_score >= 650:
+        return 0.9
+    elif trust_score >= 500:
+        return 0.7
+    elif trust_score >= 300:
+        return 0.5
+    else:
+        return 0.3
+
+def term_weight(term_months: int) -> float:
+    """Match weight of a loan term; most lenders support standard 12-60 month terms"""
+    if 12 <= term_months <= 60:
+        return 1.0
+    elif 6 <= term_months <= 84:
+        return 0.8
+    else:
+        return 0.5
+
+def trust_rate_multiplier(trust_score: float) -> float:
+    """Rate multiplier of a trust score band; higher risk borrowers pay more"""
+    if trust_score >= 800:
+        return 0.8
+    elif trust_score >= 650:
+        return 0.9
+    elif trust_score >= 500:
+        return 1.0
+    elif trust_score >= 300:
+        return 1.1
+    else:
+        return 1.2
+
+def amount_rate_multiplier(loan_amount: float) -> float:
+    """Rate multiplier of a loan amount band; larger loans often get better rates"""
+    if loan_amount >= 50000:
+        return 0.95
+    elif loan_amount >= 25000:
+        return 0.98
+    else:
+        return 1.0
+
+def term_rate_multiplier(term_months: int) -> float:
+    """Rate multiplier of a loan term band; longer terms often have higher rates"""
+    if term_months <= 12:
+        return 0.95
+    elif term_months <= 36:
+        return 1.0
+    else:
+        return 1.05
+
+# Trust score bands used by match weights, rate multipliers and reasons
+TRUST_BAND_BREAKPOINTS = np.array([300.0, 500.0, 650.0, 800.0])
+
+# Loan amount bands used by rate multipliers
+AMOUNT_BAND_BREAKPOINTS = np.array([25000.0, 50000.0])
+
+# Loan terms where the term rate multiplier changes
+TERM_RATE_BREAKPOINTS = np.array([12, 36])
+
+# Rate multiplier of each band, lowest band first
+TRUST_RATE_MULTIPLIERS = np.array([trust_rate_multiplier(score) for score in (0, 300, 500, 650, 800)])
+AMOUNT_RATE_MULTIPLIERS = np.array([amount_rate_multiplier(amount) for amount in (0, 25000, 50000)])
+TERM_RATE_MULTIPLIERS = np.array([term_rate_multiplier(term) for term in (12, 36, 37)])
+
+def rate_band(trust_score: float, loan_amount: float, term_months: int) -> Tuple[int, int, int]:
+    """Trust, amount and term band of a request, as rate sheet indexes"""
+    return (
+        int(np.searchsorted(TRUST_BAND_BREAKPOINTS, trust_score, side='right')),
+        int(np.searchsorted(AMOUNT_BAND_BREAKPOINTS, loan_amount, side='right')),
+        int(np.searchsorted(TERM_RATE_BREAKPOINTS, term_months, side='left'))
+    )
+
+def rate_sheets(min_rates: np.ndarray, max_rates: np.ndarray) -> np.ndarray:
+    """
+    Interest rate of every band combination for each lender, shaped (lenders, 5, 3, 3)
+    
+    Uses the same float operations, in the same order, as `LenderColumns.score`,
+    so a sheet entry equals the rate the matcher gives for that band.
+    """
+    min_rates = min_rates[:, None, None, None]
+    max_rates = max_rates[:, None, None, None]
+    rates = (min_rates + max_rates) / 2
+    rates = rates * TRUST_RATE_MULTIPLIERS[None, :, None, None]
+    rates = rates * AMOUNT_RATE_MULTIPLIERS[None, None, :, None]
+    rates = rates * TERM_RATE_MULTIPLIERS[None, None, None, :]
+    return np.maximum(min_rates, np.minimum(max_rates, rates))
+
+def rate_range(lender: Dict[str, Any]) -> Tuple[float, float]:
+    """Lender's interest rate range with the matcher's defaults"""
+    interest_rate_range = lender.get('interest_rate_range') or {}
+    return interest_rate_range.get('min', 5.0), interest_rate_range.get('max', 25.0)
+
+def _largest_amount_within(max_amounts: np.ndarray, ratio: float) -> np.ndarray:
+    """Largest non-negative float a per lender with a / max_amount <= ratio, by bisection over float bits"""
+    # Non-negative floats order like their bit patterns read as integers
+    low = np.zeros(len(max_amounts), dtype=np.int64)
+    high = np.full(len(max_amounts), np.array(np.inf).view(np.int64))
+    while np.any(high - low > 1):
+        middle = low + (high - low) // 2
+        within = middle.view(np.float64) / max_amounts <= ratio
+        low = np.where(within, middle, low)
+        high = np.where(within, high, middle)
+    return low.view(np.float64)
+
+class LenderColumns:
+    """
+    Lenders offering one loan type, held as column arrays for vectorized scoring
+    
+    Rows are in index load order. Eligibility is answered from the rows sorted by
+    min_trust_score and by max_loan_amount, and scoring evaluates the matching
+    formulas for all eligible rows at once with the same float operations, in the
+    same order, as the scalar formulas, so results are identical.
+    """
+    
+    def __init__(self, lenders: List[Dict[str, Any]], loan_type: str, sequence: List[int]):
+        self.lenders = lenders
+        self.loan_type = loan_type
+        self.sequence = np.array(sequence, dtype=np.int64)
+        
+        rate_ranges = [rate_range(lender) for lender in lenders]
+        requirements = [lender.get('requirements') or {} for lender in lenders]
+        
+        self.min_trust = np.array([lender.get('min_trust_score', 0) for lender in lenders], dtype=np.float64)
+        self.max_amount = np.array([lender.get('max_loan_amount', 0) for lender in lenders], dtype=np.float64)
+        self.min_rate = np.array([min_rate for min_rate, _ in rate_ranges], dtype=np.float64)
+        self.max_rate = np.array([max_rate for _, max_rate in rate_ranges], dtype=np.float64)
+        self.required_trust = np.array(
+            [requirement.get('min_trust_score', 0) for requirement in requirements], dtype=np.float64
+        )
+        self.supports_type = np.array([
+            not requirement.get('supported_loan_types') or loan_type in requirement['supported_loan_types']
+            for requirement in requirements
+        ], dtype=bool)
+        
+        self.trust_order = np.argsort(self.min_trust, kind='stable')
+        self.trust_keys = self.min_trust[self.trust_order]
+        self.amount_order = np.argsort(self.max_amount, kind='stable')
+        self.amount_keys = self.max_amount[self.amount_order]
+        
+        self._trust_breakpoints: Optional[np.ndarray] = None
+        self._amount_thresholds: Optional[np.ndarray] = None
+    
+    def __len__(self) -> int:
+        return len(self.lenders)
+    
+    def profile_class(self, trust_score: float, loan_amount: float) -> Tuple[int, int]:
+        """
+        Exact equivalence class of a trust score and loan amount for these lenders
+        
+        Every comparison the matching formulas and reasons make is `trust >= b` or
+        `amount <= t` for a breakpoint b or threshold t derived from the lenders,
+        so two requests that fall between the same breakpoints and thresholds
+        produce identical matches.
+        """
+        if self._trust_breakpoints is None:
+            self._trust_breakpoints = np.unique(np.concatenate([
+                self.min_trust, self.required_trust, TRUST_BAND_BREAKPOINTS
+            ]))
+            self._amount_thresholds = self._build_amount_thresholds()
+        
+        trust_class = int(np.searchsorted(self._trust_breakpoints, trust_score, side='right'))
+        amount_class = int(np.searchsorted(self._amount_thresholds, loan_amount, side='left'))
+        return trust_class, amount_class
+    
+    def _build_amount_thresholds(self) -> np.ndarray:
+        """Largest amounts for which each `amount <= t` style comparison still holds"""
+        positive = self.max_amount[self.max_amount > 0]
+        thresholds = [
+            self.max_amount,
+            # Reasons compare against fractions of the maximum
+            self.max_amount * 0.5,
+            self.max_amount * 0.8,
+            # Weights compare the utilization ratio, whose flip point depends on float division
+            _largest_amount_within(positive, 0.5),
+            _largest_amount_within(positive, 0.8),
+            # Rate bands are `amount >= b`, i.e. `amount <= largest float below b`
+            np.nextafter(AMOUNT_BAND_BREAKPOINTS, -np.inf)
+        ]
+        return np.unique(np.concatenate(thresholds))
+    
+    def eligible(self, trust_score: float, loan_amount: float) -> np.ndarray:
+        """Rows with min_trust_score <= trust_score and max_loan_amount >= loan_amount, in load order"""
+        # Met trust floors form a prefix of one order, covered amounts a suffix of the other
+        trust_end = int(np.searchsorted(self.trust_keys, trust_score, side='right'))
+        amount_start = int(np.searchsorted(self.amount_keys, loan_amount, side='left'))
+        
+        # Scan only the smaller side and check the other bound on it
+        if trust_end <= len(self.amount_keys) - amount_start:
+            rows = self.trust_order[:trust_end]
+            rows = rows[self.max_amount[rows] >= loan_amount]
+        else:
+            rows = self.amount_order[amount_start:]
+            rows = rows[self.min_trust[rows] <= trust_score]
+        return np.sort(rows)
+    
+    def score(self, rows: np.ndarray, trust_score: float, loan_amount: float,
+              term_months: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Match scores, interest rates and requirement checks of eligible rows"""
+        # Amount weight from utilization of each lender's maximum
+        utilization = loan_amount / self.max_amount[rows]
+        amount_weight = np.where(utilization <= 0.5, 1.0, np.where(utilization <= 0.8, 0.8, 0.6))
+        
+        # Trust 40%, amount 25%, loan type 20% (always supported here), term 15%
+        match_scores = 0.0 + trust_weight(trust_score) * 0.4
+        match_scores = match_scores + amount_weight * 0.25
+        match_scores = match_scores + 1.0 * 0.2
+        match_scores = match_scores + term_weight(term_months) * 0.15
+        
+        # Rate from the middle of each lender's range, clamped to the range
+        min_rate = self.min_rate[rows]
+        max_rate = self.max_rate[rows]
+        rates = (min_rate + max_rate) / 2
+        rates = rates * trust_rate_multiplier(trust_score)
+        rates = rates * amount_rate_multiplier(loan_amount)
+        rates = rates * term_rate_multiplier(term_months)
+        rates = np.maximum(min_rate, np.minimum(max_rate, rates))
+        
+        requirements_met = (trust_score >= self.required_trust[rows]) & self.supports_type[rows]
+        
+        return match_scores, rates, requirements_met
+
+def select_matches(match_scores: np.ndarray, sequence: np.ndarray, limit: Optional[int] = None,
+                   after: Optional[Tuple[float, int]] = None) -> np.ndarray:
+    """
+    Positions of the next `limit` matches in match order, optionally after a cursor
+    
+    Match order is rounded match score, highest first, then load sequence. Only the
+    winners are sorted: the order is encoded as one integer key per row and the
+    smallest `limit` keys are selected with a partial partition.
+    """
+    # Scores take few distinct values, so round those with Python's round to match reported scores
+    distinct, inverse = np.unique(match_scores, return_inverse=True)
+    rounded_distinct = np.array([round(float(value), 3) for value in distinct], dtype=np.float64)
+    rounded = rounded_distinct[inverse]
+    
+    positions = np.arange(len(match_scores))
+    if after is not None:
+        after_score, after_sequence = after
+        positions = positions[(rounded < after_score) |
+                              ((rounded == after_score) & (sequence > after_sequence))]
+    if len(positions) == 0:
+        return positions
+    
+    # Dense rank of the rounded score (0 = highest), then sequence, as one sortable key
+    score_levels = np.unique(rounded_distinct)
+    score_rank = len(score_levels) - 1 - np.searchsorted(score_levels, rounded[positions])
+    keys = score_rank.astype(np.int64) * (int(sequence.max()) + 1) + sequence[positions]
+    
+    if limit is not None and limit < len(positions):
+        winners = np.argpartition(keys, limit - 1)[:limit]
+        positions, keys = positions[winners], keys[winners]
+    return positions[np.argsort(keys, kind='stable')]
+
+def encode_cursor(match_score: float, sequence: int) -> str:
+    """Opaque cursor after a match with this rounded score and load sequence"""
+    return base64.urlsafe_b64encode(f"{match_score!r}:{sequence}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        match_score, sequence = base64.urlsafe_b64decode(cursor.encode()).decode().split(":")
+        return float(match_score), int(sequence)
+    except Exception:
+        raise ValueError("Invalid cursor")
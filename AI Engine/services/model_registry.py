@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Any, Optional
+from datetime import datetime
+import sys
+import os
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from ml.trust_score_model import TrustScoreModel
+
+logger = logging.getLogger(__name__)
+
+class ModelNotReadyError(RuntimeError):
+    """No trust score model version is loaded yet"""
+
+class ModelRegistry:
+    """Process-wide holder for the active trust score model version
+
+    Each version is an immutable TrustScoreModel instance. Promotion swaps the
+    shared reference, so in-flight requests keep the instance they started with
+    while new requests pick up the promoted version. Workers that did not perform
+    the promotion notice the changed active pointer on their next refresh check.
+
+    Loading, training and refreshing block, so they only run at startup and in
+    the background refresh task, off the event loop. Requests never wait on
+    them: until a version is loaded, `get_model` raises ModelNotReadyError.
+    """
+    
+    def __init__(self, refresh_interval: Optional[float] = None):
+        self._model: Optional[TrustScoreModel] = None
+        self._lock = threading.Lock()
+        self.refresh_interval = refresh_interval if refresh_interval is not None else \
+            float(os.getenv("MODEL_REFRESH_INTERVAL_SECONDS", "10"))
+        self._task: Optional[asyncio.Task] = None
+        self.loaded_at: Optional[datetime] = None
+        self.load_error: Optional[str] = None
+    
+    @property
+    def is_ready(self) -> bool:
+        return self._model is not None
+    
+    @property
+    def active_version(self) -> Optional[str]:
+        model = self._model
+        return model.version if model else None
+    
+    def load(self) -> TrustScoreModel:
+        """Load the active model version once, training the default model if none is saved"""
+        with self._lock:
+            if self._model is not None:
+                return self._model
+            
+            try:
+                model = TrustScoreModel()
+                if not model.load_model():
+                    model._train_default_model()
+                if model.version is None:
+                    # Migrate legacy unversioned files into a versioned bundle
+                    model.save_model()
+                if model.version is None:
+                    raise ValueError("Failed to save trust score model version")
+                
+                if model.get_active_version() != model.version:
+                    model.promote_version(model.version)
+                self._activate(model)
+                return model
+                
+            except Exception as e:
+                self.load_error = str(e)
+                logger.error(f"Error loading trust score model: {e}")
+                raise
+    
+    def get_model(self) -> TrustScoreModel:
+        """Get the active model without blocking, raising ModelNotReadyError until one is loaded"""
+        model = self._model
+        if model is None:
+            raise ModelNotReadyError(
+                f"Trust score model not ready: {self.load_error}" if self.load_error
+                else "Trust score model not ready"
+            )
+        return model
+    
+    def refresh(self):
+        """Switch to the promoted version if another worker changed the active pointer"""
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            current = self._model
+            active_version = current.get_active_version()
+            if active_version and active_version != current.version:
+                model = TrustScoreModel()
+                if not model.load_model(active_version):
+                    raise ValueError(f"Failed to load model version {active_version}")
+                self._activate(model)
+        except Exception as e:
+            logger.error(f"Error refreshing trust score model: {e}")
+        finally:
+            self._lock.release()
+    
+    def start(self):
+        """Start loading a missing model and picking up promotions in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    def promote(self, version: str) -> TrustScoreModel:
+        """Verify and load a saved version, then make it active for new requests"""
+        with self._lock:
+            model = TrustScoreModel()
+            if not model.load_model(version):
+                raise ValueError(f"Model version {version} could not be loaded")
+            
+            model.promote_version(version)
+            self._activate(model)
+            return model
+    
+    def list_versions(self) -> List[Dict[str, Any]]:
+        """List saved versions, flagging the active one"""
+        active_version = self.active_version
+        return [
+            {**manifest, 'active': manifest['version'] == active_version}
+            for manifest in TrustScoreModel().list_versions()
+        ]
+    
+    def status(self) -> Dict[str, Any]:
+        """Readiness details for health checks"""
+        return {
+            'ready': self.is_ready,
+            'version': self.active_version,
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+            'error': self.load_error
+        }
+    
+    def _activate(self, model: TrustScoreModel):
+        self._model = model
+        self.loaded_at = datetime.now()
+        self.load_error = None
+        logger.info(f"Trust score model version {model.version} active")
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if self._model is None:
+                    await asyncio.to_thread(self.load)
+                else:
+                    await asyncio.to_thread(self.refresh)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Trust score model still not ready: {e}")
+
+# Global model registry
+model_registry: Optional[ModelRegistry] = None
+
+def get_model_registry() -> ModelRegistry:
+    """Get model registry instance"""
+    global model_registry
+    if model_registry is None:
+        model_registry = ModelRegistry()
+    
+    return model_registry
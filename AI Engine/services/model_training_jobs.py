@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional
+from datetime import datetime
+import sys
+import os
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from ml.trust_score_model import train_model_version
+from app.services.model_registry import get_model_registry
+
+logger = logging.getLogger(__name__)
+
+# How often a running job's progress is collected from its worker process
+PROGRESS_POLL_SECONDS = 0.5
+
+class TrainingCapacityError(Exception):
+    """Raised when the retraining job limit has been reached"""
+
+class TrainingJobManager:
+    """Runs model retraining jobs in a process pool, off the event loop
+
+    Jobs move through queued -> training -> promoting -> completed (or failed).
+    While training, the worker reports its phase (extracting, fitting,
+    evaluating, saving) and boosting stages through a manager queue, so long
+    retrains show progress. At most `max_concurrent_jobs` train at once and at
+    most `max_active_jobs` may be queued or running; further submissions are
+    rejected.
+    """
+    
+    def __init__(self, max_concurrent_jobs: Optional[int] = None, max_active_jobs: Optional[int] = None,
+                 history_size: int = 100):
+        self.max_concurrent_jobs = max_concurrent_jobs or int(os.getenv("TRAINING_MAX_CONCURRENT_JOBS", "1"))
+        self.max_active_jobs = max_active_jobs or int(os.getenv("TRAINING_MAX_ACTIVE_JOBS", "4"))
+        self.history_size = history_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._manager_lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    def submit(self, training_data: List[Dict], promote: bool = True) -> Dict[str, Any]:
+        """Queue a retraining job and return its initial state"""
+        if len(self._tasks) >= self.max_active_jobs:
+            raise TrainingCapacityError(
+                f"{len(self._tasks)} retraining jobs already active (limit {self.max_active_jobs})"
+            )
+        
+        job_id = str(uuid.uuid4())
+        job = {
+            'job_id': job_id,
+            'status': 'queued',
+            'training_samples': len(training_data),
+            'promote': promote,
+            'phase': None,
+            'progress': None,
+            'version': None,
+            'metrics': None,
+            'error': None,
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'completed_at': None
+        }
+        self._jobs[job_id] = job
+        self._tasks[job_id] = asyncio.create_task(self._run(job, training_data))
+        self._trim_history()
+        
+        return dict(job)
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's current state with its elapsed time"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        
+        started_at = job['started_at']
+        finished_at = job['completed_at'] or datetime.now().isoformat()
+        elapsed = None
+        if started_at:
+            elapsed = (datetime.fromisoformat(finished_at) - datetime.fromisoformat(started_at)).total_seconds()
+        
+        return {**job, 'elapsed_seconds': elapsed}
+    
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """List known jobs, newest first"""
+        return [self.get_job(job_id) for job_id in reversed(self._jobs)]
+    
+    def shutdown(self):
+        """Cancel pending jobs and stop worker processes"""
+        for task in self._tasks.values():
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+    
+    async def _run(self, job: Dict[str, Any], training_data: List[Dict]):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._get_semaphore():
+                job['status'] = 'training'
+                job['started_at'] = datetime.now().isoformat()
+                manager = await self._get_manager()
+                progress_queue = await asyncio.to_thread(manager.Queue)
+                training = loop.run_in_executor(
+                    self._get_executor(), train_model_version, training_data, progress_queue
+                )
+                while True:
+                    done, _ = await asyncio.wait({training}, timeout=PROGRESS_POLL_SECONDS)
+                    await asyncio.to_thread(self._collect_progress, job, progress_queue)
+                    if done:
+                        break
+                results = training.result()
+                
+                if not results.get('version'):
+                    raise ValueError("Failed to save retrained model")
+                job['version'] = results['version']
+                job['metrics'] = {key: value for key, value in results.items() if key != 'version'}
+                
+                if job['promote']:
+                    job['status'] = 'promoting'
+                    await asyncio.to_thread(get_model_registry().promote, results['version'])
+                
+                job['status'] = 'completed'
+                logger.info(f"Retraining job {job['job_id']} completed with version {job['version']}")
+                
+        except asyncio.CancelledError:
+            job['status'] = 'cancelled'
+            raise
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            logger.error(f"Retraining job {job['job_id']} failed: {e}")
+        finally:
+            job['completed_at'] = datetime.now().isoformat()
+            self._tasks.pop(job['job_id'], None)
+    
+    @staticmethod
+    def _collect_progress(job: Dict[str, Any], progress_queue):
+        """Apply the latest progress reported by a job's worker"""
+        while True:
+            try:
+                phase, completed, total = progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            job['phase'] = phase
+            job['progress'] = {'completed': completed, 'total': total} if total else None
+    
+    async def _get_manager(self):
+        """Start the progress queue manager once, in a thread since it spawns a process"""
+        if self._manager_lock is None:
+            self._manager_lock = asyncio.Lock()
+        async with self._manager_lock:
+            if self._manager is None:
+                self._manager = await asyncio.to_thread(multiprocessing.Manager)
+        return self._manager
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_concurrent_jobs)
+        return self._executor
+    
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_jobs)
+        return self._semaphore
+    
+    def _trim_history(self):
+        """Drop the oldest finished jobs beyond the history size"""
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.history_size:
+                break
+            if job_id not in self._tasks:
+                del self._jobs[job_id]
+
+# Global training job manager
+training_job_manager: Optional[TrainingJobManager] = None
+
+def get_training_job_manager() -> TrainingJobManager:
+    """Get training job manager instance"""
+    global training_job_manager
+    if training_job_manager is None:
+        training_job_manager = TrainingJobManager()
+    
+    return training_job_manager
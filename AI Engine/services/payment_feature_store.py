@@ -0,0 +1,193 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import sys
+import os
+
+# Add the project root to the path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from ml.payment_aggregates import PaymentAggregate
+from app.database.connection import get_supabase_client, execute_query
+
+logger = logging.getLogger(__name__)
+
+HYDRATE_PAGE_SIZE = 1000
+
+class PaymentFeatureStore:
+    """
+    Process-local per-user payment aggregates kept current by payment writes
+
+    A user's aggregate is built from the payments table on first use and then
+    updated incrementally by the payment write paths of this worker. Entries
+    expire after `ttl_seconds` so changes written by other workers are picked up,
+    and the least recently used entries are evicted beyond `max_users`.
+    
+    Concurrent reads of a user that is not loaded share a single load. Writes that
+    arrive while it runs are noted by payment id and reconciled against the rows
+    the load read, so they are counted exactly once whichever page saw them.
+    """
+    
+    def __init__(self, ttl_seconds: Optional[float] = None, max_users: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else \
+            float(os.getenv("FEATURE_STORE_TTL_SECONDS", "300"))
+        self.max_users = max_users or int(os.getenv("FEATURE_STORE_MAX_USERS", "100000"))
+        self._entries: "OrderedDict[str, Tuple[PaymentAggregate, float, int]]" = OrderedDict()
+        self._generations = itertools.count(1)
+        # In-flight load per user and the rows written meanwhile, by payment id (None once deleted)
+        self._hydrations: Dict[str, Tuple[asyncio.Task, Dict[str, Optional[Dict[str, Any]]]]] = {}
+    
+    async def get(self, user_id: str) -> PaymentAggregate:
+        """Get a user's payment aggregate, loading it from the database if needed"""
+        if self.is_fresh(user_id):
+            self._entries.move_to_end(user_id)
+            return self._entries[user_id][0]
+        
+        hydration = self._hydrations.get(user_id)
+        if hydration is None:
+            writes: Dict[str, Optional[Dict[str, Any]]] = {}
+            hydration = (asyncio.ensure_future(self._load(user_id, writes)), writes)
+            self._hydrations[user_id] = hydration
+        
+        # A cancelled reader must not cancel the load other readers are waiting on
+        return await asyncio.shield(hydration[0])
+    
+    def is_fresh(self, user_id: str) -> bool:
+        """Whether `get` can answer for a user from memory"""
+        entry = self._entries.get(user_id)
+        return entry is not None and time.monotonic() - entry[1] < self.ttl_seconds
+    
+    def apply_created(self, payment: Dict[str, Any]):
+        """Account for a newly inserted payment row"""
+        aggregate = self._loaded(payment['user_id'])
+        if aggregate is not None:
+            aggregate.add(payment)
+        self._note_write(payment['user_id'], payment['id'], payment)
+    
+    def apply_updated(self, old_payment: Dict[str, Any], new_payment: Dict[str, Any]):
+        """Account for an updated payment row, including a change of owner"""
+        if old_payment['user_id'] == new_payment['user_id']:
+            aggregate = self._loaded(new_payment['user_id'])
+            if aggregate is not None:
+                aggregate.replace(old_payment, new_payment)
+            self._note_write(new_payment['user_id'], new_payment['id'], new_payment)
+        else:
+            self.apply_deleted(old_payment)
+            self.apply_created(new_payment)
+    
+    def apply_deleted(self, payment: Dict[str, Any]):
+        """Account for a deleted payment row"""
+        aggregate = self._loaded(payment['user_id'])
+        if aggregate is not None:
+            aggregate.remove(payment)
+        self._note_write(payment['user_id'], payment['id'], None)
+    
+    def data_version(self, user_id: str) -> Optional[Tuple[int, int]]:
+        """
+        Identify the exact payment data behind a loaded aggregate
+
+        The load generation distinguishes reloads, whose aggregate versions restart
+        from the row count, and the aggregate version counts every mutation since.
+        """
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        return (entry[2], entry[0].version)
+    
+    def invalidate(self, user_id: str):
+        """Drop a user's aggregate so the next read reloads it"""
+        self._entries.pop(user_id, None)
+        # A load already running may have read the old data; let it finish uncached
+        self._hydrations.pop(user_id, None)
+    
+    def _loaded(self, user_id: str) -> Optional[PaymentAggregate]:
+        entry = self._entries.get(user_id)
+        return entry[0] if entry is not None else None
+    
+    def _note_write(self, user_id: str, payment_id: str, payment: Optional[Dict[str, Any]]):
+        hydration = self._hydrations.get(user_id)
+        if hydration is not None:
+            hydration[1][payment_id] = payment
+    
+    async def _load(self, user_id: str, writes: Dict[str, Optional[Dict[str, Any]]]) -> PaymentAggregate:
+        """Hydrate a user, reconcile writes made meanwhile and cache the result"""
+        task = asyncio.current_task()
+        try:
+            aggregate, rows = await self._hydrate(user_id)
+            
+            # Each written payment ends up counted as its last written state, whether
+            # or not the load read it and whichever version it read
+            for payment_id, payment in writes.items():
+                loaded = rows.get(payment_id)
+                if loaded is not None:
+                    aggregate.remove(loaded)
+                if payment is not None:
+                    aggregate.add(payment)
+            
+            hydration = self._hydrations.get(user_id)
+            if hydration is not None and hydration[0] is task:
+                self._entries[user_id] = (aggregate, time.monotonic(), next(self._generations))
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+            return aggregate
+        
+        finally:
+            hydration = self._hydrations.get(user_id)
+            if hydration is not None and hydration[0] is task:
+                del self._hydrations[user_id]
+    
+    async def _hydrate(self, user_id: str) -> Tuple[PaymentAggregate, Dict[str, Dict[str, Any]]]:
+        """Build a user's aggregate from their full payment history, with the rows read by id
+
+        Pages follow a keyset on (created_at, id), so rows inserted or deleted while
+        loading cannot shift a row into a second page or out of every page.
+        """
+        try:
+            supabase = get_supabase_client()
+            aggregate = PaymentAggregate()
+            rows: Dict[str, Dict[str, Any]] = {}
+            last: Optional[Dict[str, Any]] = None
+            while True:
+                query = (
+                    supabase.table("payments")
+                        .select("id, user_id, amount, status, loan_type, created_at")
+                        .eq("user_id", user_id)
+                        .order("created_at")
+                        .order("id")
+                        .limit(HYDRATE_PAGE_SIZE)
+                )
+                if last is not None:
+                    query = query.or_(
+                        f'created_at.gt."{last["created_at"]}",'
+                        f'and(created_at.eq."{last["created_at"]}",id.gt."{last["id"]}")'
+                    )
+                response = await execute_query(query)
+                
+                for payment in response.data:
+                    aggregate.add(payment)
+                    rows[payment['id']] = payment
+                
+                if len(response.data) < HYDRATE_PAGE_SIZE:
+                    break
+                last = response.data[-1]
+            
+            return aggregate, rows
+            
+        except Exception as e:
+            logger.error(f"Error loading payment aggregate for user {user_id}: {e}")
+            raise
+
+# Global payment feature store
+payment_feature_store: Optional[PaymentFeatureStore] = None
+
+def get_payment_feature_store() -> PaymentFeatureStore:
+    """Get payment feature store instance"""
+    global payment_feature_store
+    if payment_feature_store is None:
+        payment_feature_store = PaymentFeatureStore()
+    
+    return payment_feature_store
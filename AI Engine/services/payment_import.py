@@ -0,0 +1,219 @@
+import asyncio
+import csv
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Any, Optional
+import os
+
+from app.services.payment_ingestion import PaymentIngestion
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_FORMATS = ("csv", "ndjson")
+
+# Finished imports kept for progress lookups
+MAX_TRACKED_IMPORTS = 100
+
+class PaymentImport:
+    """
+    Streaming payment import from a CSV or NDJSON byte stream
+    
+    The body is decoded incrementally and parsed record by record; rows are handed
+    to a PaymentIngestion in batches of `batch_size`, with the next batch parsed
+    while the previous one is being inserted. Records longer than
+    `max_record_bytes`, such as the rest of a file after an unbalanced CSV quote,
+    are rejected as row errors and parsing resumes at the next line. Memory
+    therefore stays bounded by two batches and one record regardless of the file.
+    """
+    
+    def __init__(self, file_format: str, import_id: Optional[str] = None, batch_size: Optional[int] = None,
+                 max_record_bytes: Optional[int] = None):
+        if file_format not in SUPPORTED_FORMATS:
+            raise ValueError(f"Unsupported import format: {file_format}")
+        
+        self.import_id = import_id or str(uuid.uuid4())
+        self.file_format = file_format
+        self.batch_size = batch_size or int(os.getenv("PAYMENT_IMPORT_BATCH_SIZE", "2000"))
+        self.max_record_bytes = max_record_bytes or int(os.getenv("PAYMENT_IMPORT_MAX_RECORD_BYTES", "1048576"))
+        self.ingestion = PaymentIngestion(idempotency_key=self.import_id)
+        
+        self.status = "running"
+        self.error: Optional[str] = None
+        self.bytes_received = 0
+        self.rows_parsed = 0
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+    
+    async def run(self, stream: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Consume the whole stream and return the final progress report"""
+        pending: Optional[asyncio.Task] = None
+        try:
+            batch: List[Dict[str, Any]] = []
+            indexes: List[int] = []
+            async for index, row in self._rows(stream):
+                batch.append(row)
+                indexes.append(index)
+                if len(batch) >= self.batch_size:
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.create_task(self.ingestion.add_rows(batch, indexes))
+                    batch, indexes = [], []
+            
+            if pending is not None:
+                await pending
+                pending = None
+            if batch:
+                await self.ingestion.add_rows(batch, indexes)
+            
+            self.status = "rescoring"
+            await self.ingestion.finish()
+            self.status = "completed"
+        
+        except Exception as e:
+            if pending is not None:
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            self.status = "failed"
+            self.error = str(e)
+            logger.error(f"Payment import {self.import_id} failed: {e}")
+            raise
+        
+        finally:
+            self.finished_at = time.monotonic()
+            logger.info(
+                f"Payment import {self.import_id} {self.status}: {self.rows_parsed} rows, "
+                f"{self.ingestion.inserted} inserted, {self.ingestion.failed} failed"
+            )
+        
+        return self.progress()
+    
+    def progress(self) -> Dict[str, Any]:
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            'import_id': self.import_id,
+            'format': self.file_format,
+            'status': self.status,
+            'error': self.error,
+            'bytes_received': self.bytes_received,
+            'rows_parsed': self.rows_parsed,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.rows_parsed / elapsed, 1) if elapsed > 0 else 0.0,
+            **self.ingestion.report()
+        }
+    
+    async def _rows(self, stream: AsyncIterator[bytes]) -> AsyncIterator:
+        """Yield (row index, row) pairs; unparseable records are reported as row errors"""
+        parse = self._parse_csv_record if self.file_format == "csv" else self._parse_ndjson_record
+        header: Optional[List[str]] = None
+        index = 0
+        
+        async for record in self._records(stream):
+            if self.file_format == "csv" and header is None:
+                if record is None:
+                    raise ValueError(f"CSV header exceeds {self.max_record_bytes} bytes")
+                header = [name.strip() for name in next(csv.reader([record.decode("utf-8-sig")]))]
+                continue
+            
+            self.rows_parsed += 1
+            try:
+                if record is None:
+                    raise ValueError(f"record exceeds {self.max_record_bytes} bytes")
+                row = parse(record.decode("utf-8-sig"), header)
+            except (ValueError, csv.Error) as e:
+                self.ingestion.reject_row(index, [f"parse error: {e}"])
+            else:
+                yield index, row
+            index += 1
+    
+    async def _records(self, stream: AsyncIterator[bytes]) -> AsyncIterator[Optional[bytes]]:
+        """
+        Split the stream into raw records, keeping quoted CSV newlines intact
+        
+        Lines are split on the newline byte, which never occurs inside a multi-byte
+        UTF-8 sequence, and records are decoded by the caller. A CSV record is
+        complete once its quotes are balanced; the parity is updated per line, so
+        each byte is counted once. A record that grows past `max_record_bytes` is
+        yielded as None and the rest of it is skipped up to the next newline.
+        """
+        buffer = b""
+        parts: List[bytes] = []
+        size = 0
+        in_quotes = False
+        skipping = False
+        
+        async for chunk in stream:
+            self.bytes_received += len(chunk)
+            if skipping:
+                newline = chunk.find(b"\n")
+                if newline < 0:
+                    continue
+                chunk, skipping = chunk[newline + 1:], False
+            
+            lines = []
+            if b"\n" in chunk:
+                *lines, buffer = (buffer + chunk).split(b"\n")
+            else:
+                buffer += chunk
+            for line in lines:
+                parts.append(line)
+                size += len(line) + 1
+                if self.file_format == "csv" and line.count(b'"') % 2:
+                    in_quotes = not in_quotes
+                
+                if size > self.max_record_bytes:
+                    yield None
+                elif not in_quotes:
+                    record = b"\n".join(parts).rstrip(b"\r")
+                    if record.strip():
+                        yield record
+                else:
+                    continue
+                parts, size, in_quotes = [], 0, False
+            
+            if size + len(buffer) > self.max_record_bytes:
+                yield None
+                buffer, parts, size, in_quotes, skipping = b"", [], 0, False, True
+        
+        record = b"\n".join(parts + [buffer]).rstrip(b"\r")
+        if not skipping and record.strip():
+            yield record
+    
+    @staticmethod
+    def _parse_csv_record(record: str, header: List[str]) -> Dict[str, Any]:
+        values = next(csv.reader([record]))
+        if len(values) != len(header):
+            raise ValueError(f"expected {len(header)} fields, got {len(values)}")
+        # Empty cells stand for missing optional fields
+        return {name: value for name, value in zip(header, values) if value != ""}
+    
+    @staticmethod
+    def _parse_ndjson_record(record: str, header: Optional[List[str]]) -> Dict[str, Any]:
+        row = json.loads(record)
+        if not isinstance(row, dict):
+            raise ValueError("each line must be a JSON object")
+        return row
+
+# Recent imports by id, for progress reporting
+payment_imports: "OrderedDict[str, PaymentImport]" = OrderedDict()
+
+def start_payment_import(file_format: str, import_id: Optional[str] = None) -> PaymentImport:
+    """Create and track a payment import"""
+    payment_import = PaymentImport(file_format, import_id=import_id)
+    payment_imports[payment_import.import_id] = payment_import
+    payment_imports.move_to_end(payment_import.import_id)
+    
+    # Forget the oldest finished imports beyond the limit
+    overflow = len(payment_imports) - MAX_TRACKED_IMPORTS
+    finished = [tracked_id for tracked_id, tracked in payment_imports.items()
+                if tracked.status in ("completed", "failed")]
+    for tracked_id in finished[:max(overflow, 0)]:
+        del payment_imports[tracked_id]
+    
+    return payment_import
+
+def get_payment_import(import_id: str) -> Optional[PaymentImport]:
+    """Get a tracked payment import"""
+    return payment_imports.get(import_id)
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime
+from typing import Dict, List, Any, Optional
+import os
+
+from pydantic import ValidationError
+
+from app.database.connection import get_supabase_client, execute_query, find_missing_user_ids
+from app.models.schemas import PaymentCreate
+from app.services.payment_feature_store import get_payment_feature_store
+from app.services.trust_score_cache import get_trust_score_cache
+from app.services.trust_score_service import TrustScoreService
+
+logger = logging.getLogger(__name__)
+
+# Namespace for deterministic payment ids derived from a batch key and row index
+PAYMENT_ID_NAMESPACE = uuid.UUID("6f1c1f2e-5a55-4f4e-9a43-3f0f5c9d7b21")
+
+# Row errors kept in a report; the failed count stays exact beyond this
+MAX_REPORTED_ERRORS = 1000
+
+# Users per batched rescoring call, bounding memory for very large loads
+RESCORE_BATCH_SIZE = 1000
+
+class PaymentIngestion:
+    """
+    One bulk payment load, fed with rows and finished with a single rescoring pass
+    
+    Rows are validated individually, checked for existing users with set-based
+    lookups and inserted in chunks of `chunk_size`, with at most `max_concurrency`
+    chunk inserts in flight and up to `max_retries` retries per chunk. Each row's
+    id is derived from the batch key and its row index and inserted with
+    ignore-duplicates upserts, so a retried chunk or a replayed request with the
+    same idempotency key never duplicates rows.
+    """
+    
+    def __init__(self, idempotency_key: Optional[str] = None, chunk_size: Optional[int] = None,
+                 max_concurrency: Optional[int] = None, max_retries: Optional[int] = None):
+        self.batch_key = idempotency_key or str(uuid.uuid4())
+        self.chunk_size = chunk_size or int(os.getenv("BULK_INSERT_CHUNK_SIZE", "500"))
+        self.max_concurrency = max_concurrency or int(os.getenv("BULK_INSERT_MAX_CONCURRENCY", "4"))
+        self.max_retries = max_retries if max_retries is not None else \
+            int(os.getenv("BULK_INSERT_MAX_RETRIES", "3"))
+        self.supabase = get_supabase_client()
+        self.feature_store = get_payment_feature_store()
+        self.cache = get_trust_score_cache()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        self.total_rows = 0
+        self.inserted = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.affected_users = set()
+        self.rescored_users = 0
+    
+    async def add_rows(self, rows: List[Dict[str, Any]], indexes: Optional[List[int]] = None):
+        """Validate and insert rows, numbered consecutively unless `indexes` gives their positions"""
+        if indexes is None:
+            indexes = list(range(self.total_rows, self.total_rows + len(rows)))
+        self.total_rows += len(rows)
+        
+        # Validate each row on its own so one bad row doesn't reject the load
+        valid = []
+        for index, row in zip(indexes, rows):
+            try:
+                valid.append((index, PaymentCreate(**row)))
+            except ValidationError as e:
+                self._record_error(index, row.get('user_id') if isinstance(row, dict) else None,
+                                   [f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                                    for error in e.errors()])
+            except TypeError as e:
+                self._record_error(index, None, [str(e)])
+        
+        # Reject rows of unknown users with set-based lookups
+        missing_user_ids = set(await find_missing_user_ids([payment.user_id for _, payment in valid]))
+        payment_rows = []
+        for index, payment in valid:
+            if payment.user_id in missing_user_ids:
+                self._record_error(index, payment.user_id, ["user_id: User not found"])
+            else:
+                payment_rows.append(self._to_row(index, payment))
+        
+        chunks = [
+            payment_rows[start:start + self.chunk_size]
+            for start in range(0, len(payment_rows), self.chunk_size)
+        ]
+        await asyncio.gather(*(self._insert_chunk(chunk) for chunk in chunks))
+    
+    async def finish(self) -> Dict[str, Any]:
+        """Rescore every affected user in one batched pass and return the report"""
+        trust_service = TrustScoreService()
+        user_ids = sorted(self.affected_users)
+        for start in range(0, len(user_ids), RESCORE_BATCH_SIZE):
+            try:
+                result = await trust_service.calculate_trust_scores_batch(user_ids[start:start + RESCORE_BATCH_SIZE])
+                self.rescored_users += result['total_scored']
+            except Exception as e:
+                logger.error(f"Batched rescoring after bulk load {self.batch_key} failed: {e}")
+        
+        return self.report()
+    
+    def report(self) -> Dict[str, Any]:
+        return {
+            'batch_key': self.batch_key,
+            'total_rows': self.total_rows,
+            'inserted': self.inserted,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'affected_users': len(self.affected_users),
+            'rescored_users': self.rescored_users,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+    
+    def _to_row(self, index: int, payment: PaymentCreate) -> Dict[str, Any]:
+        row = {
+            key: value.isoformat() if isinstance(value, date) else value
+            for key, value in payment.dict().items()
+        }
+        row["id"] = str(uuid.uuid5(PAYMENT_ID_NAMESPACE, f"{self.batch_key}:{index}"))
+        row["created_at"] = datetime.now().isoformat()
+        row["updated_at"] = row["created_at"]
+        row["_index"] = index
+        return row
+    
+    async def _insert_chunk(self, chunk: List[Dict[str, Any]]):
+        """Insert one chunk, retrying with backoff and recording its rows on final failure"""
+        indexes = [row.pop("_index") for row in chunk]
+        
+        async with self._semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = await execute_query(
+                        self.supabase.table("payments")
+                            .upsert(chunk, on_conflict="id", ignore_duplicates=True)
+                    )
+                    break
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        logger.error(f"Bulk payment chunk failed after {attempt + 1} attempts: {e}")
+                        for index, row in zip(indexes, chunk):
+                            self._record_error(index, row['user_id'], [f"insert failed: {e}"])
+                        return
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+        
+        # Rows already present from an earlier attempt or request are not returned
+        self.inserted += len(response.data)
+        self.duplicates += len(chunk) - len(response.data)
+        for payment_row in response.data:
+            self.feature_store.apply_created(payment_row)
+        
+        returned_ids = {payment_row['id'] for payment_row in response.data}
+        for row in chunk:
+            if row['id'] not in returned_ids:
+                # A timed-out attempt may have written it without this worker seeing it
+                self.feature_store.invalidate(row['user_id'])
+            self.cache.invalidate(row['user_id'])
+            self.affected_users.add(row['user_id'])
+    
+    def reject_row(self, index: int, messages: List[str]):
+        """Count a row that could not even be parsed as a failure"""
+        self.total_rows += 1
+        self._record_error(index, None, messages)
+    
+    def _record_error(self, index: int, user_id: Optional[str], messages: List[str]):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'index': index, 'user_id': user_id, 'errors': messages})
+
+async def ingest_payments(rows: List[Dict[str, Any]], idempotency_key: Optional[str] = None) -> Dict[str, Any]:
+    """Load a list of payment rows and rescore the affected users"""
+    ingestion = PaymentIngestion(idempotency_key=idempotency_key)
+    await ingestion.add_rows(rows)
+    return await ingestion.finish()
@@ -0,0 +1,173 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Dict, Any, List, Optional, Tuple
+import os
+
+from app.services.trust_score_service import TrustScoreService
+
+logger = logging.getLogger(__name__)
+
+class RescoreQueue:
+    """
+    Debounced background trust score recomputation
+    
+    Write paths enqueue the affected user and return immediately. A user is
+    rescored once no further request for them has arrived for `quiet_period`
+    seconds, but never later than `max_delay` seconds after their first pending
+    request, so a steady stream of writes still converges. At most `max_depth`
+    users can be waiting; beyond that `enqueue` refuses and the caller scores
+    inline, which pushes back on the writers.
+    """
+    
+    def __init__(self, workers: Optional[int] = None, quiet_period: Optional[float] = None,
+                 max_delay: Optional[float] = None, max_depth: Optional[int] = None):
+        self.workers = workers or int(os.getenv("RESCORE_WORKERS", "4"))
+        self.quiet_period = quiet_period if quiet_period is not None else \
+            float(os.getenv("RESCORE_QUIET_PERIOD_SECONDS", "1.0"))
+        self.max_delay = max_delay if max_delay is not None else \
+            float(os.getenv("RESCORE_MAX_DELAY_SECONDS", "5.0"))
+        self.max_depth = max_depth or int(os.getenv("RESCORE_MAX_QUEUE_DEPTH", "10000"))
+        
+        # user_id -> (first requested at, due at)
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        self._schedule: List[Tuple[float, str]] = []
+        self._ready: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._in_progress = 0
+        
+        self.enqueued = 0
+        self.debounced = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+    
+    def start(self):
+        """Start the dispatcher and worker tasks on the running event loop"""
+        if self._tasks:
+            return
+        
+        self._ready = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._work()))
+        logger.info(f"Rescore queue started with {self.workers} workers")
+    
+    async def stop(self):
+        """Stop all tasks; users still waiting are rescored on their next write"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        
+        dropped = len(self._pending) + (self._ready.qsize() if self._ready else 0)
+        if dropped:
+            logger.warning(f"Rescore queue stopped with {dropped} users not rescored")
+        self._pending.clear()
+        self._schedule = []
+    
+    def enqueue(self, user_id: str) -> bool:
+        """Request a rescore for a user; returns False if the caller must score inline"""
+        if not self._tasks:
+            return False
+        
+        now = time.monotonic()
+        pending = self._pending.get(user_id)
+        if pending is not None:
+            first_requested = pending[0]
+            due = min(now + self.quiet_period, first_requested + self.max_delay)
+            self.debounced += 1
+        else:
+            if len(self._pending) + self._ready.qsize() >= self.max_depth:
+                self.rejected += 1
+                return False
+            first_requested = now
+            due = now + self.quiet_period
+            self.enqueued += 1
+        
+        self._pending[user_id] = (first_requested, due)
+        heapq.heappush(self._schedule, (due, user_id))
+        self._wakeup.set()
+        return True
+    
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        oldest = min((first for first, _ in self._pending.values()), default=None)
+        return {
+            'running': bool(self._tasks),
+            'workers': self.workers,
+            'quiet_period_seconds': self.quiet_period,
+            'max_delay_seconds': self.max_delay,
+            'max_depth': self.max_depth,
+            'pending': len(self._pending),
+            'ready': self._ready.qsize() if self._ready else 0,
+            'in_progress': self._in_progress,
+            'oldest_pending_seconds': round(now - oldest, 3) if oldest is not None else 0.0,
+            'enqueued': self.enqueued,
+            'debounced': self.debounced,
+            'rejected': self.rejected,
+            'completed': self.completed,
+            'failed': self.failed,
+            'last_lag_seconds': round(self.last_lag_seconds, 3),
+            'max_lag_seconds': round(self.max_lag_seconds, 3)
+        }
+    
+    async def _dispatch(self):
+        """Move users whose debounce window has closed onto the ready queue"""
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            
+            while self._schedule and self._schedule[0][0] <= now:
+                due, user_id = heapq.heappop(self._schedule)
+                pending = self._pending.get(user_id)
+                # Skip entries superseded by a later request for the same user
+                if pending is None or pending[1] != due:
+                    continue
+                del self._pending[user_id]
+                self._ready.put_nowait((user_id, pending[0]))
+            
+            timeout = self._schedule[0][0] - now if self._schedule else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _work(self):
+        while True:
+            user_id, first_requested = await self._ready.get()
+            self._in_progress += 1
+            try:
+                await TrustScoreService().calculate_trust_score(user_id)
+                self.completed += 1
+                self.last_lag_seconds = time.monotonic() - first_requested
+                self.max_lag_seconds = max(self.max_lag_seconds, self.last_lag_seconds)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Background rescore failed for user {user_id}: {e}")
+            finally:
+                self._in_progress -= 1
+                self._ready.task_done()
+
+async def request_rescore(user_id: str):
+    """Queue a user for background rescoring, scoring inline when the queue is full"""
+    if not get_rescore_queue().enqueue(user_id):
+        await TrustScoreService().calculate_trust_score(user_id)
+
+# Global rescore queue
+rescore_queue: Optional[RescoreQueue] = None
+
+def get_rescore_queue() -> RescoreQueue:
+    """Get rescore queue instance"""
+    global rescore_queue
+    if rescore_queue is None:
+        rescore_queue = RescoreQueue()
+    
+    return rescore_queue
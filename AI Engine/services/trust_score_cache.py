@@ -0,0 +1,76 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Hashable, Optional
+import os
+
+from app.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+class TrustScoreCache:
+    """
+    Cache of computed trust scores, keyed by user and the versions of their inputs
+
+    A cached result is only served while its payment data version, profile version
+    and model version all match the current ones. Invalidating a user sets their
+    profile version to the next value of a global counter, so a computation that
+    read a profile before an update can never be served after it. Profile versions
+    are kept for at most `maxsize` users in LRU order; users without one read the
+    highest version evicted so far, which stays above anything they were cached at.
+    """
+    
+    def __init__(self, maxsize: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.maxsize = maxsize or int(os.getenv("TRUST_SCORE_CACHE_SIZE", "50000"))
+        self._results = TTLCache(
+            maxsize=self.maxsize,
+            ttl=ttl_seconds if ttl_seconds is not None else float(os.getenv("TRUST_SCORE_CACHE_TTL_SECONDS", "600"))
+        )
+        self._profile_versions: "OrderedDict[str, int]" = OrderedDict()
+        self._evicted_version = 0
+        self._version_counter = 0
+        self.invalidations = 0
+    
+    def profile_version(self, user_id: str) -> int:
+        return self._profile_versions.get(user_id, self._evicted_version)
+    
+    def get(self, user_id: str, version: Hashable) -> Optional[Dict[str, Any]]:
+        """Return the cached result if it was computed from exactly these input versions"""
+        entry = self._results.peek(user_id)
+        if entry is not None and entry[0] != version:
+            # Drop results of stale inputs so the lookup below counts a miss
+            self._results.pop(user_id)
+        
+        entry = self._results.get(user_id)
+        return entry[1] if entry is not None else None
+    
+    def put(self, user_id: str, version: Hashable, result: Dict[str, Any]):
+        self._results.set(user_id, (version, result))
+    
+    def invalidate(self, user_id: str):
+        """Drop a user's cached score after their payments or profile changed"""
+        self._version_counter += 1
+        self._profile_versions[user_id] = self._version_counter
+        self._profile_versions.move_to_end(user_id)
+        while len(self._profile_versions) > self.maxsize:
+            _, evicted = self._profile_versions.popitem(last=False)
+            self._evicted_version = max(self._evicted_version, evicted)
+        self._results.pop(user_id)
+        self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._results.stats(),
+            'invalidations': self.invalidations,
+            'profile_versions': len(self._profile_versions)
+        }
+
+# Global trust score cache
+trust_score_cache: Optional[TrustScoreCache] = None
+
+def get_trust_score_cache() -> TrustScoreCache:
+    """Get trust score cache instance"""
+    global trust_score_cache
+    if trust_score_cache is None:
+        trust_score_cache = TrustScoreCache()
+    
+    return trust_score_cache
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import Dict, List, Any, Optional
 from datetime import datetime
@@ -7,32 +8,80 @@ import os
 # Add the project root to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
-from ml.trust_score_model import TrustScoreModel
-from app.database.connection import get_supabase_client
+from ml.payment_aggregates import PaymentAggregate
+from app.database.connection import DB_MAX_CONCURRENCY, get_supabase_client, execute_query
+from app.services.model_registry import get_model_registry
+from app.services.model_training_jobs import get_training_job_manager
+from app.services.payment_feature_store import get_payment_feature_store
+from app.services.trust_score_cache import get_trust_score_cache
+from app.utils.concurrency import SingleFlight, gather_all
 from app.models.schemas import TrustScoreCreate, TrustScore, User, Payment
 
 logger = logging.getLogger(__name__)
 
+# Set-based batch scoring limits: ids per `in_` filter, rows per page and rows per insert
+BATCH_ID_CHUNK_SIZE = 200
+BATCH_PAGE_SIZE = 1000
+BATCH_INSERT_CHUNK_SIZE = 500
+
+# Concurrent recomputations for the same user share one execution
+trust_score_flights = SingleFlight()
+
 class TrustScoreService:
     """Service for managing trust scores and ML model interactions"""
     
     def __init__(self):
-        self.model = TrustScoreModel()
+        self._model = None
         self.supabase = get_supabase_client()
+        self.feature_store = get_payment_feature_store()
+        self.cache = get_trust_score_cache()
+    
+    @property
+    def model(self):
+        """Active model, fixed for this service instance on first use; raises ModelNotReadyError"""
+        if self._model is None:
+            self._model = get_model_registry().get_model()
+        return self._model
     
     async def calculate_trust_score(self, user_id: str, include_payment_history: bool = True) -> Dict[str, Any]:
-        """Calculate trust score for a user"""
+        """Calculate trust score for a user, coalescing concurrent calls for the same user"""
+        result = await trust_score_flights.do(
+            (user_id, include_payment_history),
+            lambda: self._calculate_trust_score(user_id, include_payment_history)
+        )
+        return dict(result)
+    
+    async def _calculate_trust_score(self, user_id: str, include_payment_history: bool) -> Dict[str, Any]:
+        """Calculate trust score for a user, reusing the last result while its inputs are unchanged"""
         try:
+            profile_version = self.cache.profile_version(user_id)
+            
+            # Get running payment aggregates, loading a cold one alongside the user row
+            user_data = None
+            payment_data = PaymentAggregate()
+            payment_version = None
+            if include_payment_history:
+                if self.feature_store.is_fresh(user_id):
+                    payment_data = await self.feature_store.get(user_id)
+                else:
+                    payment_data, user_data = await gather_all(
+                        self.feature_store.get(user_id),
+                        self._get_user_data(user_id)
+                    )
+                payment_version = self.feature_store.data_version(user_id)
+            
+            # Serve the cached score if payments, profile and model are all unchanged
+            cache_version = (payment_version, profile_version, self.model.version)
+            cached = self.cache.get(user_id, cache_version)
+            if cached is not None:
+                return dict(cached)
+            
             # Get user data
-            user_data = await self._get_user_data(user_id)
+            if user_data is None:
+                user_data = await self._get_user_data(user_id)
             if not user_data:
                 raise ValueError(f"User {user_id} not found")
             
-            # Get payment history
-            payment_data = []
-            if include_payment_history:
-                payment_data = await self._get_payment_data(user_id)
-            
             # Predict trust score
             prediction = self.model.predict_trust_score(user_data, payment_data)
             
@@ -42,37 +91,112 @@ class TrustScoreService:
                 score=prediction['trust_score'],
                 level=prediction['trust_level'],
                 factors=prediction['factors'],
-                confidence=prediction['confidence']
+                confidence=prediction['confidence'],
+                model_version=prediction['model_version']
             )
             
-            saved_score = await self._save_trust_score(trust_score_data)
-            
-            # Update user with trust score
-            await self._update_user_trust_score(user_id, prediction['trust_score'], prediction['trust_level'])
+            # Save trust score and update the user concurrently
+            saved_score, _ = await gather_all(
+                self._save_trust_score(trust_score_data),
+                self._update_user_trust_score(user_id, prediction['trust_score'], prediction['trust_level'])
+            )
             
-            return {
+            result = {
                 'trust_score': prediction['trust_score'],
                 'trust_level': prediction['trust_level'],
                 'confidence': prediction['confidence'],
                 'factors': prediction['factors'],
                 'feature_importance': prediction['feature_importance'],
+                'model_version': prediction['model_version'],
                 'created_at': saved_score.created_at,
                 'user_id': user_id
             }
+            self.cache.put(user_id, cache_version, result)
+            
+            return dict(result)
             
         except Exception as e:
             logger.error(f"Error calculating trust score for user {user_id}: {e}")
             raise
     
+    async def calculate_trust_scores_batch(self, user_ids: List[str],
+                                           include_payment_history: bool = True) -> Dict[str, Any]:
+        """Calculate trust scores for many users with set-based reads and writes"""
+        try:
+            user_ids = list(dict.fromkeys(user_ids))
+            
+            # Fetch users and payments with chunked `in_` queries
+            users = await self._get_users_data(user_ids)
+            users_by_id = {user['id']: user for user in users}
+            found_users = [users_by_id[user_id] for user_id in user_ids if user_id in users_by_id]
+            missing_user_ids = [user_id for user_id in user_ids if user_id not in users_by_id]
+            
+            payments_by_user = {}
+            if include_payment_history and found_users:
+                payments_by_user = await self._get_payments_data([user['id'] for user in found_users])
+            
+            # One scale + predict over the whole feature matrix
+            predictions = self.model.predict_trust_scores_batch(found_users, payments_by_user)
+            
+            # Bulk insert trust score rows
+            trust_score_rows = [
+                TrustScoreCreate(
+                    user_id=user['id'],
+                    score=prediction['trust_score'],
+                    level=prediction['trust_level'],
+                    factors=prediction['factors'],
+                    confidence=prediction['confidence'],
+                    model_version=prediction['model_version']
+                ).dict()
+                for user, prediction in zip(found_users, predictions)
+            ]
+            saved_scores = await self._save_trust_scores(trust_score_rows)
+            
+            # Update users' latest scores; rows are never inserted, so deleted users stay deleted
+            updated_at = datetime.now().isoformat()
+            await self._update_users_trust_scores([
+                {
+                    "id": user['id'],
+                    "trust_score": prediction['trust_score'],
+                    "trust_level": prediction['trust_level'],
+                    "updated_at": updated_at
+                }
+                for user, prediction in zip(found_users, predictions)
+            ])
+            
+            results = [
+                {
+                    'trust_score': prediction['trust_score'],
+                    'trust_level': prediction['trust_level'],
+                    'confidence': prediction['confidence'],
+                    'factors': prediction['factors'],
+                    'model_version': prediction['model_version'],
+                    'created_at': saved_score.created_at,
+                    'user_id': user['id']
+                }
+                for user, prediction, saved_score in zip(found_users, predictions, saved_scores)
+            ]
+            
+            return {
+                'results': results,
+                'total_scored': len(results),
+                'missing_user_ids': missing_user_ids
+            }
+            
+        except Exception as e:
+            logger.error(f"Error calculating batch trust scores for {len(user_ids)} users: {e}")
+            raise
+    
     async def get_trust_score(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get the latest trust score for a user"""
         try:
-            response = self.supabase.table("trust_scores") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .order("created_at", desc=True) \
-                .limit(1) \
-                .execute()
+            response = await execute_query(
+                self.supabase.table("trust_scores")
+                    .select("*")
+                    .eq("user_id", user_id)
+                    .order("created_at", desc=True)
+                    .limit(1)
+            )
             
             if response.data:
                 return response.data[0]
@@ -85,12 +209,13 @@ class TrustScoreService:
     async def get_trust_score_history(self, user_id: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get trust score history for a user"""
         try:
-            response = self.supabase.table("trust_scores") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .order("created_at", desc=True) \
-                .limit(limit) \
-                .execute()
+            response = await execute_query(
+                self.supabase.table("trust_scores")
+                    .select("*")
+                    .eq("user_id", user_id)
+                    .order("created_at", desc=True)
+                    .limit(limit)
+            )
             
             return response.data
             
@@ -99,25 +224,29 @@ class TrustScoreService:
             raise
     
     async def retrain_model(self, training_data: List[Dict]) -> Dict[str, Any]:
-        """Retrain the ML model with new data"""
+        """Start a background job that retrains the ML model and promotes the result"""
         try:
-            logger.info("Starting model retraining...")
-            results = self.model.train(training_data)
-            logger.info("Model retraining completed successfully")
-            return results
+            job = get_training_job_manager().submit(training_data)
+            logger.info(f"Model retraining job {job['job_id']} queued")
+            return job
             
         except Exception as e:
-            logger.error(f"Error retraining model: {e}")
+            logger.error(f"Error starting model retraining: {e}")
             raise
     
+    async def get_retraining_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get the status of a retraining job"""
+        return get_training_job_manager().get_job(job_id)
+    
     async def get_model_performance(self) -> Dict[str, Any]:
         """Get model performance metrics"""
         try:
-            # This would typically load from a metrics table
-            # For now, return basic info
+            manifest = self.model.manifest
             return {
-                'model_type': 'GradientBoostingRegressor',
-                'last_trained': datetime.now().isoformat(),
+                'model_type': manifest.get('model_type', type(self.model.model).__name__),
+                'model_version': self.model.version,
+                'last_trained': manifest.get('created_at'),
+                'metrics': manifest.get('metrics', {}),
                 'feature_count': len(self.model.feature_names),
                 'status': 'active'
             }
@@ -126,14 +255,42 @@ class TrustScoreService:
             logger.error(f"Error getting model performance: {e}")
             raise
     
+    async def list_model_versions(self) -> List[Dict[str, Any]]:
+        """List saved model versions"""
+        try:
+            return get_model_registry().list_versions()
+            
+        except Exception as e:
+            logger.error(f"Error listing model versions: {e}")
+            raise
+    
+    def get_service_metrics(self) -> Dict[str, Any]:
+        """Get runtime metrics of the scoring service"""
+        return {
+            'cache': self.cache.stats(),
+            'coalescing': trust_score_flights.stats()
+        }
+    
+    async def promote_model_version(self, version: str) -> Dict[str, Any]:
+        """Make a saved model version active for new requests"""
+        try:
+            # Loading and verifying the bundle blocks, keep it off the event loop
+            model = await asyncio.to_thread(get_model_registry().promote, version)
+            return model.manifest
+            
+        except Exception as e:
+            logger.error(f"Error promoting model version {version}: {e}")
+            raise
+    
     async def _get_user_data(self, user_id: str) -> Dict[str, Any]:
         """Get user data from database"""
         try:
-            response = self.supabase.table("users") \
-                .select("*") \
-                .eq("id", user_id) \
-                .single() \
-                .execute()
+            response = await execute_query(
+                self.supabase.table("users")
+                    .select("*")
+                    .eq("id", user_id)
+                    .single()
+            )
             
             if response.data:
                 return response.data
@@ -143,27 +300,83 @@ class TrustScoreService:
             logger.error(f"Error getting user data for {user_id}: {e}")
             raise
     
-    async def _get_payment_data(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get payment data for a user"""
+    async def _get_users_data(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get user rows for many ids using chunked `in_` queries"""
         try:
-            response = self.supabase.table("payments") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .order("created_at", desc=True) \
-                .execute()
+            users = []
+            for start in range(0, len(user_ids), BATCH_ID_CHUNK_SIZE):
+                chunk = user_ids[start:start + BATCH_ID_CHUNK_SIZE]
+                response = await execute_query(
+                    self.supabase.table("users")
+                        .select("*")
+                        .in_("id", chunk)
+                )
+                users.extend(response.data)
             
-            return response.data
+            return users
+            
+        except Exception as e:
+            logger.error(f"Error getting user data for {len(user_ids)} users: {e}")
+            raise
+    
+    async def _get_payments_data(self, user_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Get payment histories for many users, grouped by user id (newest first)"""
+        try:
+            payments_by_user = {user_id: [] for user_id in user_ids}
+            for start in range(0, len(user_ids), BATCH_ID_CHUNK_SIZE):
+                chunk = user_ids[start:start + BATCH_ID_CHUNK_SIZE]
+                offset = 0
+                while True:
+                    response = await execute_query(
+                        self.supabase.table("payments")
+                            .select("*")
+                            .in_("user_id", chunk)
+                            .order("created_at", desc=True)
+                            .order("id", desc=True)
+                            .range(offset, offset + BATCH_PAGE_SIZE - 1)
+                    )
+                    
+                    for payment in response.data:
+                        payments_by_user[payment['user_id']].append(payment)
+                    
+                    if len(response.data) < BATCH_PAGE_SIZE:
+                        break
+                    offset += BATCH_PAGE_SIZE
+            
+            return payments_by_user
             
         except Exception as e:
-            logger.error(f"Error getting payment data for user {user_id}: {e}")
+            logger.error(f"Error getting payment data for {len(user_ids)} users: {e}")
+            raise
+    
+    async def _save_trust_scores(self, trust_score_rows: List[Dict[str, Any]]) -> List[TrustScore]:
+        """Bulk insert trust score rows in chunks"""
+        try:
+            saved_scores = []
+            for start in range(0, len(trust_score_rows), BATCH_INSERT_CHUNK_SIZE):
+                chunk = trust_score_rows[start:start + BATCH_INSERT_CHUNK_SIZE]
+                response = await execute_query(
+                    self.supabase.table("trust_scores")
+                        .insert(chunk)
+                )
+                
+                if len(response.data) != len(chunk):
+                    raise ValueError("Failed to save trust scores")
+                saved_scores.extend(TrustScore(**row) for row in response.data)
+            
+            return saved_scores
+            
+        except Exception as e:
+            logger.error(f"Error saving trust scores: {e}")
             raise
     
     async def _save_trust_score(self, trust_score_data: TrustScoreCreate) -> TrustScore:
         """Save trust score to database"""
         try:
-            response = self.supabase.table("trust_scores") \
-                .insert(trust_score_data.dict()) \
-                .execute()
+            response = await execute_query(
+                self.supabase.table("trust_scores")
+                    .insert(trust_score_data.dict())
+            )
             
             if response.data:
                 return TrustScore(**response.data[0])
@@ -173,17 +386,40 @@ class TrustScoreService:
             logger.error(f"Error saving trust score: {e}")
             raise
     
-    async def _update_user_trust_score(self, user_id: str, score: float, level: str):
+    async def _update_users_trust_scores(self, user_rows: List[Dict[str, Any]]):
+        """
+        Write many users' latest trust scores
+        
+        Each user is updated by id, in concurrent waves no larger than the database
+        executor. An upsert of these partial rows would fail on required user
+        columns and recreate users deleted since scoring.
+        """
+        try:
+            for start in range(0, len(user_rows), DB_MAX_CONCURRENCY):
+                await gather_all(*(
+                    self._update_user_trust_score(
+                        row['id'], row['trust_score'], row['trust_level'], updated_at=row['updated_at']
+                    )
+                    for row in user_rows[start:start + DB_MAX_CONCURRENCY]
+                ))
+            
+        except Exception as e:
+            logger.error(f"Error updating trust scores of {len(user_rows)} users: {e}")
+            raise
+    
+    async def _update_user_trust_score(self, user_id: str, score: float, level: str,
+                                       updated_at: Optional[str] = None):
         """Update user with latest trust score"""
         try:
-            self.supabase.table("users") \
-                .update({
-                    "trust_score": score,
-                    "trust_level": level,
-                    "updated_at": datetime.now().isoformat()
-                }) \
-                .eq("id", user_id) \
-                .execute()
+            await execute_query(
+                self.supabase.table("users")
+                    .update({
+                        "trust_score": score,
+                        "trust_level": level,
+                        "updated_at": updated_at or datetime.now().isoformat()
+                    })
+                    .eq("id", user_id)
+            )
                 
         except Exception as e:
             logger.error(f"Error updating user trust score: {e}")
@@ -192,7 +428,7 @@ class TrustScoreService:
     async def analyze_payment_behavior(self, user_id: str) -> Dict[str, Any]:
         """Analyze payment behavior patterns"""
         try:
-            payments = await self._get_payment_data(user_id)
+            payments = await self.feature_store.get(user_id)
             
             if not payments:
                 return {
@@ -208,33 +444,28 @@ class TrustScoreService:
                     'income_stability_score': 0
                 }
             
-            # Calculate metrics
-            total_payments = len(payments)
-            on_time_payments = sum(1 for p in payments if p['status'] == 'on_time')
-            late_payments = sum(1 for p in payments if p['status'] == 'late')
-            missed_payments = sum(1 for p in payments if p['status'] == 'missed')
+            # Calculate metrics from the running aggregate
+            total_payments = payments.total_count
+            on_time_payments = payments.count('on_time')
+            late_payments = payments.count('late')
+            missed_payments = payments.count('missed')
             
-            average_payment_amount = sum(p['amount'] for p in payments) / total_payments
+            average_payment_amount = self.model.calculate_average_payment_amount(payments)
             
             # Calculate payment frequency (payments per month)
-            if payments:
-                first_payment = min(payments, key=lambda x: x['created_at'])
-                last_payment = max(payments, key=lambda x: x['created_at'])
-                
-                start_date = datetime.strptime(first_payment['created_at'], '%Y-%m-%d')
-                end_date = datetime.strptime(last_payment['created_at'], '%Y-%m-%d')
-                months_diff = (end_date - start_date).days / 30
-                
-                payment_frequency = total_payments / max(months_diff, 1)
-            else:
-                payment_frequency = 0
+            first_day, last_day = payments.date_range()
+            start_date = datetime.strptime(first_day, '%Y-%m-%d')
+            end_date = datetime.strptime(last_day, '%Y-%m-%d')
+            months_diff = (end_date - start_date).days / 30
+            
+            payment_frequency = total_payments / max(months_diff, 1)
             
             # Get user data for additional calculations
             user_data = await self._get_user_data(user_id)
             income = user_data.get('income', 0) if user_data else 0
             
             # Calculate credit utilization and debt-to-income ratio
-            total_debt = sum(p['amount'] for p in payments if p['status'] in ['late', 'missed'])
+            total_debt = payments.debt_sum
             credit_utilization = self.model.calculate_credit_utilization(total_debt, income * 0.3)
             debt_to_income_ratio = self.model.calculate_debt_to_income_ratio(total_debt, income)
             
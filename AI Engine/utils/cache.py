@@ -0,0 +1,77 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a time-to-live"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry and mark it recently used, counting the hit or miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+    
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry without marking it used or counting a hit or miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            return default
+        return value
+    
+    def set(self, key: Hashable, value: Any):
+        """Store an entry, evicting the least recently used ones beyond `maxsize`"""
+        self._entries[key] = (value, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
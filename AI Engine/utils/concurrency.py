@@ -0,0 +1,99 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+class GatherError(Exception):
+    """Several concurrent operations failed"""
+    
+    def __init__(self, errors: List[BaseException]):
+        self.errors = errors
+        super().__init__(
+            f"{len(errors)} concurrent operations failed: " +
+            "; ".join(f"{type(error).__name__}: {error}" for error in errors)
+        )
+
+async def gather_all(*aws: Awaitable[Any]) -> List[Any]:
+    """
+    Await operations concurrently and return their results in argument order
+
+    Every operation runs to completion before failures are reported, so none is
+    left running unobserved. A single failure is re-raised unchanged, which keeps
+    callers' exception handling intact; several are raised together as a
+    GatherError.
+    """
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if len(errors) == 1:
+        raise errors[0]
+    if errors:
+        raise GatherError(errors)
+    return results
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls for the same key into shared executions
+
+    A call made while nothing runs for its key starts an execution. A call made
+    while one is already running cannot reuse it, since that execution may have
+    read its inputs before the caller's write, so it waits for one trailing
+    execution that starts afterwards and is shared by every caller arriving
+    in the meantime.
+    """
+    
+    def __init__(self):
+        self._running: Dict[Hashable, asyncio.Future] = {}
+        self._trailing: Dict[Hashable, Tuple[asyncio.Future, Callable[[], Awaitable[Any]]]] = {}
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+    
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn` for `key`, or share an execution that will reflect this call"""
+        self.calls += 1
+        
+        if key not in self._running:
+            return await asyncio.shield(self._start(key, fn))
+        
+        if key in self._trailing:
+            self.collapsed += 1
+            return await asyncio.shield(self._trailing[key][0])
+        
+        future = asyncio.get_running_loop().create_future()
+        self._trailing[key] = (future, fn)
+        return await asyncio.shield(future)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'collapsed': self.collapsed,
+            'in_flight': len(self._running)
+        }
+    
+    def _start(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        self.executions += 1
+        task = asyncio.ensure_future(self._execute(key, fn))
+        self._running[key] = task
+        return task
+    
+    async def _execute(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            return await fn()
+        finally:
+            trailing = self._trailing.pop(key, None)
+            if trailing is None:
+                del self._running[key]
+            else:
+                future, trailing_fn = trailing
+                self._start(key, trailing_fn).add_done_callback(
+                    lambda task: _copy_outcome(task, future)
+                )
+
+def _copy_outcome(task: asyncio.Future, future: asyncio.Future):
+    if future.done():
+        return
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
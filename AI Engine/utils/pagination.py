@@ -0,0 +1,40 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+class InvalidCursorError(ValueError):
+    """A page cursor that was not issued by `page_of`"""
+
+def encode_page_cursor(row: Dict[str, Any]) -> str:
+    """Opaque cursor after a row, from its created_at and id"""
+    return base64.urlsafe_b64encode(json.dumps([row['created_at'], row['id']]).encode()).decode()
+
+def decode_page_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        return str(created_at), str(row_id)
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+def paginate(query, limit: int, offset: int = 0, cursor: Optional[str] = None):
+    """
+    Order a list query newest first and restrict it to one page plus one row
+    
+    Rows are ordered by (created_at, id), so the order is total and stable under
+    concurrent inserts. With a cursor the page starts right after the cursor row
+    using a keyset condition that an index on (created_at, id) answers without
+    scanning earlier rows; otherwise `offset` rows are skipped as before.
+    """
+    query = query.order("created_at", desc=True).order("id", desc=True)
+    if cursor:
+        created_at, row_id = decode_page_cursor(cursor)
+        return query.or_(
+            f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        ).limit(limit + 1)
+    return query.range(offset, offset + limit)
+
+def page_of(rows: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Split the extra row fetched by `paginate` off a page and turn it into the next cursor"""
+    if len(rows) > limit:
+        return rows[:limit], encode_page_cursor(rows[limit - 1])
+    return rows, None
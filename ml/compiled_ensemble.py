@@ -0,0 +1,171 @@
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.preprocessing import StandardScaler
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+_SIGN_MASK = np.int64(0x7FFFFFFFFFFFFFFF)
+
+def _float_to_ordered(values: np.ndarray) -> np.ndarray:
+    """Map float64 values to int64 keys with the same ordering"""
+    bits = values.view(np.int64)
+    return bits ^ ((bits >> 63) & _SIGN_MASK)
+
+def _ordered_to_float(keys: np.ndarray) -> np.ndarray:
+    """Inverse of _float_to_ordered"""
+    bits = keys ^ ((keys >> 63) & _SIGN_MASK)
+    return bits.view(np.float64)
+
+class CompiledEnsemble:
+    """
+    Flat-array form of a fitted GradientBoostingRegressor with its StandardScaler folded in
+
+    All trees are concatenated into parallel node arrays (feature index, threshold,
+    children, leaf value). Leaves point to themselves, so every row can be walked
+    for `max_depth` steps across all trees at once. Thresholds are expressed on raw
+    (unscaled) features and chosen so each split makes exactly the decision sklearn
+    makes on the scaled, float32-cast input; leaf contributions are accumulated in
+    the same order as sklearn, so predictions match `model.predict` bit for bit.
+    """
+    
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, leaf_value: np.ndarray, roots: np.ndarray,
+                 baseline: float, max_depth: int):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        # Interleaved (right, left) children, indexed by 2 * node + went_left
+        self.children = np.empty(2 * len(left), dtype=np.intp)
+        self.children[0::2] = right
+        self.children[1::2] = left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.baseline = baseline
+        self.max_depth = max_depth
+    
+    @classmethod
+    def compile(cls, model: GradientBoostingRegressor,
+                scaler: Optional[StandardScaler] = None) -> 'CompiledEnsemble':
+        """Compile a fitted single-output squared-error GradientBoostingRegressor"""
+        if not isinstance(model, GradientBoostingRegressor) or model.loss != 'squared_error':
+            raise ValueError("Only squared-error GradientBoostingRegressor models can be compiled")
+        
+        n_features = model.n_features_in_
+        mean = np.zeros(n_features)
+        scale = np.ones(n_features)
+        if scaler is not None:
+            if getattr(scaler, 'mean_', None) is not None:
+                mean = scaler.mean_
+            if getattr(scaler, 'scale_', None) is not None:
+                scale = scaler.scale_
+        
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_[:, 0]:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+            
+            roots.append(offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            values.append(model.learning_rate * tree.value[:, 0, 0])
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+        
+        feature = np.concatenate(features).astype(np.intp)
+        threshold = np.concatenate(thresholds)
+        internal = np.isfinite(threshold)
+        threshold[internal] = cls._fold_thresholds(
+            threshold[internal], mean[feature[internal]], scale[feature[internal]]
+        )
+        
+        baseline = float(model._raw_predict_init(np.zeros((1, n_features)))[0, 0])
+        
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            leaf_value=np.concatenate(values),
+            roots=np.array(roots, dtype=np.intp),
+            baseline=baseline,
+            max_depth=max_depth
+        )
+    
+    @staticmethod
+    def _fold_thresholds(threshold: np.ndarray, mean: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        """Find, per split, the largest raw value x with float32((x - mean) / scale) <= threshold
+
+        The scaled, float32-cast value is monotone in x, so the split is a half-line on
+        the raw feature; its end point is found by bisecting over ordered float64 keys.
+        """
+        def goes_left(keys):
+            with np.errstate(over='ignore', invalid='ignore'):
+                x = _ordered_to_float(keys)
+                return ((x - mean) / scale).astype(np.float32) <= threshold
+        
+        lo = np.full(threshold.shape, _float_to_ordered(np.array([-np.inf]))[0])
+        hi = np.full(threshold.shape, _float_to_ordered(np.array([np.inf]))[0])
+        # Invariant: lo goes left, hi goes right (inf always goes right of a finite split)
+        for _ in range(66):
+            mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)
+            left = goes_left(mid)
+            lo = np.where(left, mid, lo)
+            hi = np.where(left, hi, mid)
+        
+        return _ordered_to_float(lo)
+    
+    def predict(self, X: np.ndarray, chunk_size: int = 256) -> np.ndarray:
+        """Predict raw (unscaled) feature rows, walking cache-sized row chunks"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        
+        return np.concatenate(
+            [self._predict_chunk(X[start:start + chunk_size]) for start in range(0, len(X), chunk_size)]
+        ) if len(X) else np.empty(0)
+    
+    def predict_one(self, x: np.ndarray) -> float:
+        """Predict a single raw feature row"""
+        x = np.asarray(x, dtype=np.float64).ravel()
+        
+        nodes = self.roots
+        for _ in range(self.max_depth):
+            go_left = x.take(self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_left)
+        
+        contributions = np.empty(len(self.roots) + 1)
+        contributions[0] = self.baseline
+        contributions[1:] = self.leaf_value.take(nodes)
+        return float(np.cumsum(contributions)[-1])
+    
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        n_rows, n_features = X.shape
+        flat = np.ascontiguousarray(X).ravel()
+        row_offsets = (np.arange(n_rows) * n_features)[:, None]
+        
+        nodes = np.broadcast_to(self.roots, (n_rows, len(self.roots)))
+        for _ in range(self.max_depth):
+            go_left = flat.take(row_offsets + self.feature.take(nodes)) <= self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_left)
+        
+        # Accumulate left to right, as sklearn adds one stage at a time
+        contributions = np.empty((n_rows, len(self.roots) + 1))
+        contributions[:, 0] = self.baseline
+        contributions[:, 1:] = self.leaf_value.take(nodes)
+        return np.cumsum(contributions, axis=1)[:, -1]
+    
+    def max_abs_error(self, model: GradientBoostingRegressor, scaler: Optional[StandardScaler],
+                      X: np.ndarray) -> float:
+        """Largest difference from the sklearn pipeline on `X`, for parity checks"""
+        X_scaled = scaler.transform(X) if scaler is not None else X
+        if len(X) == 0:
+            return 0.0
+        return float(np.max(np.abs(self.predict(X) - model.predict(X_scaled))))
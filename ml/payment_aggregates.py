@@ -0,0 +1,139 @@
+import heapq
+from typing import Dict, List, Optional, Iterable, Tuple
+from datetime import datetime, timedelta
+
+DEBT_STATUSES = ('late', 'missed')
+
+class PaymentAggregate:
+    """
+    Running payment statistics for one user, updated one payment at a time
+
+    Holds counts by status, amount and debt sums, monthly and daily buckets and a
+    version that increases on every change. Counting recent payments uses a
+    watermark that advances with the cutoff date: days older than the watermark
+    are folded into a single counter, so each payment is retired at most once.
+    """
+    
+    def __init__(self):
+        self.total_count = 0
+        self.status_counts: Dict[str, int] = {}
+        self.amount_sum = 0.0
+        self.debt_sum = 0.0
+        self.monthly: Dict[str, Dict[str, float]] = {}
+        self.daily_counts: Dict[str, int] = {}
+        self.loan_type_counts: Dict[str, int] = {}
+        self.version = 0
+        
+        # Recent-payment window: payments on days before the watermark are retired
+        self._watermark = ''
+        self._retired_count = 0
+        self._window_heap: List[str] = []
+        self._window_days = set()
+    
+    @classmethod
+    def from_payments(cls, payments: Iterable[Dict]) -> 'PaymentAggregate':
+        """Build an aggregate from a payment history in a single pass"""
+        aggregate = cls()
+        for payment in payments:
+            aggregate.add(payment)
+        return aggregate
+    
+    def __len__(self) -> int:
+        return self.total_count
+    
+    def add(self, payment: Dict):
+        """Account for a new payment"""
+        self._apply(payment, 1)
+    
+    def remove(self, payment: Dict):
+        """Remove a previously added payment"""
+        self._apply(payment, -1)
+    
+    def replace(self, old_payment: Dict, new_payment: Dict):
+        """Swap a payment for its updated version"""
+        self._apply(old_payment, -1)
+        self._apply(new_payment, 1)
+    
+    def count(self, status: str) -> int:
+        return self.status_counts.get(status, 0)
+    
+    def date_range(self) -> Optional[Tuple[str, str]]:
+        """First and last payment dates as YYYY-MM-DD strings"""
+        if not self.daily_counts:
+            return None
+        return min(self.daily_counts), max(self.daily_counts)
+    
+    def monthly_trends(self) -> Dict[str, Dict[str, float]]:
+        """Monthly buckets, newest month first"""
+        return {month: dict(bucket) for month, bucket in sorted(self.monthly.items(), reverse=True)}
+    
+    def count_since(self, cutoff: datetime) -> int:
+        """Count payments whose creation date (at midnight) is at or after `cutoff`"""
+        cutoff_day = cutoff.date()
+        if cutoff != datetime.combine(cutoff_day, datetime.min.time()):
+            cutoff_day += timedelta(days=1)
+        cutoff_key = cutoff_day.isoformat()
+        
+        if cutoff_key < self._watermark:
+            return sum(count for day, count in self.daily_counts.items() if day >= cutoff_key)
+        
+        while self._window_heap and self._window_heap[0] < cutoff_key:
+            day = heapq.heappop(self._window_heap)
+            self._window_days.discard(day)
+            self._retired_count += self.daily_counts.get(day, 0)
+        self._watermark = cutoff_key
+        
+        return self.total_count - self._retired_count
+    
+    def _apply(self, payment: Dict, sign: int):
+        status = payment['status']
+        amount = payment['amount']
+        created_at = str(payment['created_at'])
+        day, month = created_at[:10], created_at[:7]
+        loan_type = payment.get('loan_type')
+        
+        self.total_count += sign
+        self._increment(self.status_counts, status, sign)
+        if sign > 0:
+            self.amount_sum += amount
+        else:
+            self.amount_sum -= amount
+        if status in DEBT_STATUSES:
+            if sign > 0:
+                self.debt_sum += amount
+            else:
+                self.debt_sum -= amount
+        
+        bucket = self.monthly.setdefault(month, {'total': 0, 'count': 0, 'on_time': 0, 'late': 0, 'missed': 0})
+        bucket['total'] += sign * amount
+        bucket['count'] += sign
+        if status in bucket:
+            bucket[status] += sign
+        if bucket['count'] == 0:
+            del self.monthly[month]
+        
+        self._increment(self.daily_counts, day, sign)
+        if loan_type is not None:
+            self._increment(self.loan_type_counts, getattr(loan_type, 'value', loan_type), sign)
+        
+        if day < self._watermark:
+            self._retired_count += sign
+        elif day not in self._window_days:
+            self._window_days.add(day)
+            heapq.heappush(self._window_heap, day)
+        
+        # Drop rounding left over from add/remove cycles once a sum is empty
+        if self.total_count == 0:
+            self.amount_sum = 0.0
+        if not any(self.count(debt_status) for debt_status in DEBT_STATUSES):
+            self.debt_sum = 0.0
+        
+        self.version += 1
+    
+    @staticmethod
+    def _increment(counts: Dict[str, int], key: str, sign: int):
+        value = counts.get(key, 0) + sign
+        if value:
+            counts[key] = value
+        else:
+            counts.pop(key, None)
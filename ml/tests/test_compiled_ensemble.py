@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.preprocessing import StandardScaler
+
+from ml.compiled_ensemble import CompiledEnsemble
+
+N_FEATURES = 6
+
+@pytest.fixture(scope="module")
+def fitted():
+    """A small scaled ensemble on features of very different magnitudes"""
+    rng = np.random.default_rng(7)
+    X = rng.normal(size=(400, N_FEATURES)) * np.array([1e-3, 1.0, 50.0, 1e4, 0.5, 3.0])
+    X[:, 4] = np.round(X[:, 4], 1)  # repeated values put thresholds between them
+    y = X[:, 0] * 1e3 + np.sin(X[:, 1]) + (X[:, 3] > 0) * 2.0 + rng.normal(scale=0.1, size=len(X))
+    
+    scaler = StandardScaler().fit(X)
+    model = GradientBoostingRegressor(n_estimators=40, learning_rate=0.1, max_depth=4, random_state=0)
+    model.fit(scaler.transform(X), y)
+    return model, scaler, CompiledEnsemble.compile(model, scaler), X
+
+def sklearn_predict(model, scaler, X):
+    return model.predict(scaler.transform(X))
+
+def test_random_rows_match_exactly(fitted):
+    model, scaler, compiled, X = fitted
+    rng = np.random.default_rng(11)
+    rows = np.vstack([X, X * rng.uniform(0.5, 1.5, size=X.shape), rng.normal(size=(300, N_FEATURES)) * 1e4])
+    
+    assert np.array_equal(compiled.predict(rows), sklearn_predict(model, scaler, rows))
+
+def test_rows_on_split_boundaries_match_exactly(fitted):
+    model, scaler, compiled, X = fitted
+    internal = np.isfinite(compiled.threshold)
+    features = compiled.feature[internal]
+    # Folded thresholds and the neighbouring floats on either side of each split
+    edges = compiled.threshold[internal]
+    values = np.concatenate([edges, np.nextafter(edges, np.inf), np.nextafter(edges, -np.inf)])
+    
+    rows = np.tile(np.median(X, axis=0), (len(values), 1))
+    rows[np.arange(len(values)), np.tile(features, 3)] = values
+    
+    assert np.array_equal(compiled.predict(rows), sklearn_predict(model, scaler, rows))
+
+def test_single_row_matches_exactly(fitted):
+    model, scaler, compiled, X = fitted
+    for row in X[:25]:
+        expected = sklearn_predict(model, scaler, row.reshape(1, -1))
+        assert np.array_equal(compiled.predict(row), expected)
+        assert compiled.predict_one(row) == expected[0]
+
+def test_chunked_prediction_matches_exactly(fitted):
+    model, scaler, compiled, X = fitted
+    assert np.array_equal(compiled.predict(X, chunk_size=7), sklearn_predict(model, scaler, X))
+    assert compiled.max_abs_error(model, scaler, X) == 0.0
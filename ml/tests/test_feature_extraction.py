@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from ml.trust_score_model import TrustScoreModel
+
+def payment(days_ago: float, status: str = 'on_time', amount: float = 100.0) -> dict:
+    created_at = datetime.now() - timedelta(days=days_ago)
+    return {'amount': amount, 'status': status, 'created_at': created_at.isoformat()}
+
+def user(user_id: str, **fields) -> dict:
+    return {'id': user_id, 'date_of_birth': '1990-05-17', 'income': 52000.0, 'credit_score': 690, **fields}
+
+def random_history(rng: np.random.Generator, count: int) -> list:
+    return [
+        payment(rng.uniform(0, 720), rng.choice(['on_time', 'late', 'missed']), rng.lognormal(5, 0.5))
+        for _ in range(count)
+    ]
+
+CASES = {
+    'no_payments': (user('no_payments'), []),
+    'one_payment': (user('one_payment'), [payment(3, amount=0.1)]),
+    'one_missed_payment': (user('one_missed_payment', income=0), [payment(400, 'missed', 250.0)]),
+    'same_day': (user('same_day'), [payment(5, 'late', 0.1), payment(5, 'on_time', 0.2), payment(5, 'missed', 0.3)]),
+    'out_of_order': (user('out_of_order', credit_score=300), [
+        payment(30, amount=19.99), payment(700, 'late', 1e6), payment(1, amount=0.01), payment(365, 'missed', 7.5)
+    ]),
+    'around_cutoff': (user('around_cutoff'), [payment(359.999), payment(360), payment(360.001)]),
+    'twelve_payments': (user('twelve_payments'), [payment(days * 30 + 2, amount=0.1 * days) for days in range(12)]),
+    'no_credit_score': ({'id': 'no_credit_score', 'date_of_birth': '2001-02-28', 'income': 9000.5}, [payment(10)]),
+}
+
+@pytest.fixture(scope="module")
+def model():
+    return TrustScoreModel()
+
+def scalar_features(model, users, histories):
+    return np.vstack([model.extract_features(u, h) for u, h in zip(users, histories)])
+
+def test_edge_cases_match_row_by_row(model):
+    users = [u for u, _ in CASES.values()]
+    histories = [h for _, h in CASES.values()]
+    
+    batch = model.extract_features_batch(users, histories)
+    
+    assert batch.shape == (len(users), len(model.feature_names))
+    assert np.array_equal(batch, scalar_features(model, users, histories))
+
+def test_random_histories_match_row_by_row(model):
+    rng = np.random.default_rng(3)
+    users = [user(f'user-{i}', income=float(rng.lognormal(10, 0.5))) for i in range(60)]
+    histories = [random_history(rng, int(count)) for count in rng.poisson(8, size=len(users))]
+    
+    batch = model.extract_features_batch(users, histories)
+    
+    assert np.array_equal(batch, scalar_features(model, users, histories))
+
+def test_histories_by_user_id(model):
+    users = [u for u, _ in CASES.values()]
+    by_id = {u['id']: h for u, h in CASES.values() if h}
+    
+    batch = model.extract_features_batch(users, by_id)
+    
+    histories = [by_id.get(u['id'], []) for u in users]
+    assert np.array_equal(batch, scalar_features(model, users, histories))